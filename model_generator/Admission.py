@@ -0,0 +1,198 @@
+import asyncio
+import itertools
+import math
+import time
+
+from Metrics import increment, record_stage
+
+# Weights of the pre-flight cost estimate. One unit is about a typical card
+# (five short text fields and a version 3 or 4 QR code). On planar renders
+# the build time grew linearly with the dark QR modules and the glyphs, at
+# about one glyph per seven modules.
+COST_BASE = 0.4
+COST_PER_FIELD = 0.02
+COST_PER_GLYPH = 0.0036
+COST_PER_MODULE = 0.00055
+
+
+def estimate_cost(fields, glyphs, modules):
+    """Estimated cost of a card with fields non-empty fields (QR included),
+    glyphs non-blank characters and modules dark QR modules."""
+    return (
+        COST_BASE
+        + COST_PER_FIELD * fields
+        + COST_PER_GLYPH * glyphs
+        + COST_PER_MODULE * modules
+    )
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised by AdmissionController.acquire; status_code is the HTTP status
+    to answer with and reason a short label for metrics."""
+
+    def __init__(self, message, status_code, reason):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("client", "cost", "enqueued", "order", "future")
+
+    def __init__(self, client, cost, order, future):
+        self.client = client
+        self.cost = cost
+        self.enqueued = time.monotonic()
+        self.order = order
+        self.future = future
+
+
+class AdmissionController:
+    """Decides which generations run, and in which order.
+
+    At most workers generations run and at most queue_size wait. A request
+    is turned away when:
+
+    - its cost is above max_cost (413), at any load;
+    - its client already holds its fair share of the running and waiting
+      slots (429): the slots divided by the clients holding any plus one,
+      so a newcomer always finds a slot free, even behind a single busy
+      client;
+    - every slot is taken (503);
+    - it costs heavy_cost or more while the queue is at least half full
+      (503), so heavy work is retried later instead of stalling the queue.
+
+    A request that continues admitted work (the next card of a batch) is
+    only turned away when it is oversized: otherwise it waits.
+
+    Waiting requests start with the clients that have the fewest running
+    generations first and, among those, the cheapest first. A request's
+    cost counts one unit less for every aging seconds it has waited, so
+    heavy requests are deferred but not starved.
+
+    Not thread-safe: every method must be called from the event loop.
+    """
+
+    def __init__(self, workers, queue_size, max_cost=0.0, heavy_cost=0.0, aging=10.0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_cost = max_cost
+        self.heavy_cost = heavy_cost
+        self.aging = aging
+        self.running = 0
+        self._waiting = []
+        # client -> [running, waiting]
+        self._clients = {}
+        self._order = itertools.count()
+
+    @property
+    def pending(self):
+        return self.running + len(self._waiting)
+
+    def _reject(self, message, status_code, reason):
+        increment("card_admission_total", outcome=reason)
+        raise AdmissionRejected(message, status_code, reason)
+
+    def fair_share(self, client):
+        """Slots client may hold: the slots divided by the clients currently
+        holding any, counting one more (client itself if it holds none, else
+        room for the next newcomer)."""
+        clients = len(self._clients) + 1
+        return max(1, math.ceil((self.workers + self.queue_size) / clients))
+
+    def _check_load(self, client, cost):
+        # Before the capacity check, so a client that filled the queue itself
+        # is told to slow down rather than that the service is full.
+        counts = self._clients.get(client)
+        if counts is not None and sum(counts) >= self.fair_share(client):
+            self._reject("Too many generations for this client, retry later.", 429, "client")
+        if self.pending >= self.workers + self.queue_size:
+            self._reject("Card generation is at capacity, retry later.", 503, "capacity")
+        if (
+            self.heavy_cost
+            and cost >= self.heavy_cost
+            and len(self._waiting) * 2 >= max(self.queue_size, 1)
+        ):
+            self._reject(
+                "Card generation is busy and this card is expensive, retry later.",
+                503, "pressure")
+
+    def check(self, client, cost, continuation=False):
+        """Raises AdmissionRejected if acquire would turn the request away now."""
+        if self.max_cost and cost > self.max_cost:
+            self._reject(
+                f"Card is too complex (estimated cost {cost:.1f}, limit {self.max_cost:g}).",
+                413, "oversized")
+        if not continuation:
+            self._check_load(client, cost)
+
+    async def acquire(self, client, cost, continuation=False):
+        """Waits for a generation slot; release(client) must follow.
+
+        Raises AdmissionRejected when the request is turned away.
+        """
+        self.check(client, cost, continuation)
+
+        counts = self._clients.setdefault(client, [0, 0])
+        if self.running < self.workers and not self._waiting:
+            self.running += 1
+            counts[0] += 1
+            increment("card_admission_total", outcome="admitted")
+            record_stage("queue_wait", 0.0)
+            return
+
+        waiter = _Waiter(
+            client, cost, next(self._order), asyncio.get_running_loop().create_future())
+        self._waiting.append(waiter)
+        counts[1] += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just before the cancel: hand the slot on.
+                self.release(client)
+            else:
+                self._waiting.remove(waiter)
+                self._forget(client, waiting=True)
+            raise
+        finally:
+            record_stage("queue_wait", time.monotonic() - waiter.enqueued)
+        increment("card_admission_total", outcome="admitted")
+
+    def release(self, client):
+        """Frees the slot client got from acquire and starts the next waiter."""
+        self.running -= 1
+        self._forget(client, waiting=False)
+        self._dispatch()
+
+    def _forget(self, client, waiting):
+        counts = self._clients[client]
+        counts[1 if waiting else 0] -= 1
+        if not any(counts):
+            del self._clients[client]
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self.running < self.workers and self._waiting:
+            waiter = min(
+                self._waiting,
+                key=lambda w: (
+                    self._clients[w.client][0],
+                    w.cost - (now - w.enqueued) / self.aging if self.aging else w.cost,
+                    w.order,
+                ),
+            )
+            self._waiting.remove(waiter)
+            counts = self._clients[waiter.client]
+            counts[1] -= 1
+            counts[0] += 1
+            self.running += 1
+            waiter.future.set_result(None)
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "waiting": len(self._waiting),
+            "waiting_cost": sum(w.cost for w in self._waiting),
+            "clients": len(self._clients),
+        }
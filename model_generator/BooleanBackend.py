@@ -0,0 +1,156 @@
+import logging
+import os
+
+from OpenSCADRunner import OpenSCADExchange
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated backend names, tried in order until one succeeds.
+BOOLEAN_BACKENDS = os.environ.get("CARVER_BOOLEAN_BACKEND", "manifold,openscad")
+
+
+class BooleanBackend:
+    """Computes the mesh booleans Carver needs."""
+
+    name = None
+
+    def difference(self, base_mesh, subtract_meshes):
+        """Returns base_mesh minus the union of subtract_meshes."""
+        raise NotImplementedError
+
+
+class OpenSCADBackend(BooleanBackend):
+    """CGAL difference through OpenSCAD, importing the meshes from the exchange workspace."""
+
+    name = "openscad"
+
+    def difference(self, base_mesh, subtract_meshes):
+        with OpenSCADExchange("boolean") as exchange:
+            base_path = exchange.add_mesh(base_mesh)
+            subtract_imports = [
+                f'    import("{exchange.add_mesh(mesh)}");' for mesh in subtract_meshes
+            ]
+
+            scad_script = [
+                "difference() {",
+                f'  import("{base_path}");',
+                "  union() {",
+            ]
+            scad_script.extend(subtract_imports)
+            scad_script.extend([
+                "  }",
+                "}"
+            ])
+
+            return exchange.render("\n".join(scad_script))
+
+
+class ManifoldBackend(BooleanBackend):
+    """In-process difference with manifold3d, straight from the trimesh arrays."""
+
+    name = "manifold"
+
+    def __init__(self):
+        try:
+            import manifold3d
+        except ModuleNotFoundError as exc:
+            raise RuntimeError(
+                "Missing dependency: manifold3d. Install with `pip install manifold3d`."
+            ) from exc
+        self._manifold3d = manifold3d
+
+    def _to_manifold(self, mesh):
+        # numpy and trimesh are imported on use so the server starts
+        # without loading them.
+        import numpy as np
+
+        manifold = self._manifold3d.Manifold(
+            self._manifold3d.Mesh(
+                vert_properties=np.asarray(mesh.vertices, dtype=np.float32),
+                tri_verts=np.asarray(mesh.faces, dtype=np.uint32),
+            )
+        )
+        status = manifold.status()
+        if status != self._manifold3d.Error.NoError:
+            raise ValueError(f"Mesh is not a manifold solid ({status.name}).")
+        return manifold
+
+    def difference(self, base_mesh, subtract_meshes):
+        import trimesh
+
+        base = self._to_manifold(base_mesh)
+        cutter = self._manifold3d.Manifold.batch_boolean(
+            [self._to_manifold(mesh) for mesh in subtract_meshes],
+            self._manifold3d.OpType.Add,
+        )
+        result = (base - cutter).to_mesh()
+        # Keep manifold's vertex indexing: merging by position would fuse the
+        # separate vertices it keeps where pockets only touch along an edge.
+        return trimesh.Trimesh(
+            vertices=result.vert_properties[:, :3],
+            faces=result.tri_verts,
+            process=False,
+        )
+
+
+class FallbackBackend(BooleanBackend):
+    """Tries each backend in turn, e.g. when one rejects non-manifold input."""
+
+    def __init__(self, backends):
+        if not backends:
+            raise ValueError("At least one boolean backend is required.")
+        self.backends = list(backends)
+        self.name = ",".join(backend.name for backend in self.backends)
+
+    def difference(self, base_mesh, subtract_meshes):
+        error = None
+        for backend in self.backends:
+            try:
+                return backend.difference(base_mesh, subtract_meshes)
+            except Exception as exc:
+                logger.warning(
+                    "Boolean backend %s failed, trying the next one: %s",
+                    backend.name,
+                    exc,
+                )
+                error = exc
+        raise error
+
+
+BACKENDS = {
+    OpenSCADBackend.name: OpenSCADBackend,
+    ManifoldBackend.name: ManifoldBackend,
+}
+
+
+def create_boolean_backend(spec):
+    """Builds a backend from a comma-separated list of names, e.g. "manifold,openscad".
+
+    Backends whose dependencies are missing are skipped as long as one
+    remains.
+    """
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    backends = []
+    for name in names:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown boolean backend: {name!r}")
+        try:
+            backends.append(BACKENDS[name]())
+        except RuntimeError as exc:
+            logger.warning("Boolean backend %s is unavailable: %s", name, exc)
+    if not backends:
+        raise RuntimeError(f"No boolean backend available from {spec!r}.")
+    if len(backends) == 1:
+        return backends[0]
+    return FallbackBackend(backends)
+
+
+_default_backend = None
+
+
+def default_boolean_backend():
+    """The backend configured through CARVER_BOOLEAN_BACKEND, shared by every Carver."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = create_boolean_backend(BOOLEAN_BACKENDS)
+    return _default_backend
@@ -0,0 +1,208 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+def _mesh_bytes(mesh):
+    if mesh is None:
+        return 0
+    if isinstance(mesh, (list, tuple)):
+        return sum(_mesh_bytes(item) for item in mesh)
+    return mesh.vertices.nbytes + mesh.faces.nbytes
+
+
+class CardSession:
+    """Editor session that keeps a card's intermediate meshes between renders.
+
+    Every intermediate mesh is a node memoized together with the inputs it
+    was built from; a render rebuilds only the nodes whose inputs changed
+    since the previous one:
+
+        base          <- design
+        carve:<field> <- design, field text/size/position
+        raised:<field><- design, field text/size/position
+        qr_cutout     <- design, QR url/position/side
+        qr_fill       <- design, QR url/position/side
+        body          <- every node above (the final difference)
+    """
+
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.last_used = time.monotonic()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self._nodes = {}
+        self._built = []
+
+    def _node(self, name, inputs, build):
+        cached = self._nodes.get(name)
+        if cached is not None and cached[0] == inputs:
+            return cached[1]
+        mesh = build()
+        self._nodes[name] = (inputs, mesh)
+        self._built.append(name)
+        return mesh
+
+    def clear(self):
+        """Drops the memoized meshes; the next render rebuilds everything."""
+        self._nodes.clear()
+        self.nbytes = 0
+
+    def render(self, carver, fillet_radius, text_fields, qr, planar=False):
+        """Builds the card, reusing every node whose inputs did not change.
+
+        text_fields is a list of (field_name, x, y, text, text_height) and
+        qr an (x, y, url, side) tuple. Returns (body, raised_meshes, qr_mesh,
+        rebuilt_node_names).
+        """
+        self._built = []
+        design = (
+            tuple(float(value) for value in carver.box_extents),
+            carver.depth,
+            fillet_radius,
+        )
+        qr_inputs = (design, tuple(qr))
+
+        raised = []
+        carves = []
+        for field_name, x, y, text, text_height in text_fields:
+            inputs = (design, x, y, text, text_height)
+            raised.append(
+                self._node(
+                    f"raised:{field_name}",
+                    inputs,
+                    lambda: carver.generate_raised_text_mesh(
+                        x, y, text=text, text_height=text_height, extra_height=0.4),
+                )
+            )
+            if not planar:
+                carves.append(
+                    (
+                        inputs,
+                        self._node(
+                            f"carve:{field_name}",
+                            inputs,
+                            lambda: carver.fill_in_text(
+                                x, y, text=text, text_height=text_height),
+                        ),
+                    )
+                )
+
+        qr_x, qr_y, url, side = qr
+        qr_mesh = self._node(
+            "qr_fill",
+            qr_inputs,
+            lambda: carver.fill_in_qr(
+                qr_x, qr_y, url=url, side=side, drop_internal_faces=True),
+        )
+
+        if planar:
+            body_inputs = (design, tuple(text_fields), qr_inputs, "planar")
+            body = self._node(
+                "body",
+                body_inputs,
+                lambda: carver.carve_planar(
+                    fillet_radius,
+                    [field[1:] for field in text_fields],
+                    qr=qr,
+                ),
+            )
+        else:
+            base = self._node(
+                "base", design, lambda: carver.generate_rounded_base(fillet_radius))
+            cutout = self._node(
+                "qr_cutout",
+                qr_inputs,
+                lambda: carver.generate_qr_cutout_mesh(qr_x, qr_y, url=url, side=side),
+            )
+            body_inputs = (design, tuple(inputs for inputs, _ in carves), qr_inputs)
+
+            def difference():
+                # The memoized base must survive the difference untouched.
+                carver.mesh = base.copy()
+                return carver.apply_difference([mesh for _, mesh in carves] + [cutout])
+
+            body = self._node("body", body_inputs, difference)
+
+        # Forget nodes of fields that are no longer on the card.
+        live = {f"raised:{field[0]}" for field in text_fields}
+        live |= {f"carve:{field[0]}" for field in text_fields}
+        live |= {"base", "qr_cutout", "qr_fill", "body"}
+        for name in list(self._nodes):
+            if name not in live:
+                del self._nodes[name]
+
+        self.nbytes = sum(_mesh_bytes(mesh) for _, mesh in self._nodes.values())
+        return body, raised, qr_mesh, list(self._built)
+
+
+class SessionStore:
+    """Sessions by id, expired after ttl idle seconds and capped in memory.
+
+    When the meshes held by all sessions exceed max_bytes, the least
+    recently used sessions lose their meshes first (their requests are
+    kept, so they still work, they just rebuild on the next render).
+    """
+
+    def __init__(self, ttl, max_bytes, max_sessions):
+        self.ttl = ttl
+        self.max_bytes = int(max_bytes)
+        self.max_sessions = int(max_sessions)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used > deadline:
+                break
+            self._sessions.popitem(last=False)
+
+    def create(self, request):
+        session = CardSession(request)
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise RuntimeError("Too many open sessions.")
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        """Returns the live session with this id, or None."""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def enforce_budget(self):
+        """Drops the meshes of the least recently used sessions until within max_bytes."""
+        with self._lock:
+            total = sum(session.nbytes for session in self._sessions.values())
+            for session in list(self._sessions.values()):
+                if total <= self.max_bytes:
+                    break
+                # A session being rendered keeps its meshes until next time.
+                if session.nbytes and session.lock.acquire(blocking=False):
+                    try:
+                        total -= session.nbytes
+                        session.clear()
+                    finally:
+                        session.lock.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(session.nbytes for session in self._sessions.values()),
+                "max_bytes": self.max_bytes,
+            }
@@ -1,31 +1,96 @@
-import subprocess
-import tempfile
-import os
+import functools
 from pathlib import Path
 
-import shutil
-import platform
+import numpy as np
+import trimesh
 
-OPENSCAD_EXEC = os.environ.get("OPENSCAD_EXEC")
+from BooleanBackend import default_boolean_backend
+from MeshCache import text_mesh_cache
+from Metrics import timed
+from OpenSCADRunner import render_scad
+from QRGenerator import QRGenerator
 
-if not OPENSCAD_EXEC:
-    # Try finding it in path
-    OPENSCAD_EXEC = shutil.which("openscad")
 
-if not OPENSCAD_EXEC and platform.system() == "Windows":
-    # Fallback to default Windows install location
-    default_win_path = Path("C:/Program Files/OpenSCAD/openscad.exe")
-    if default_win_path.exists():
-        OPENSCAD_EXEC = str(default_win_path)
+def _rounded_outline(width, height, radius, segments):
+    """Counter-clockwise outline of a rectangle with filleted corners, centered at the origin.
 
-if not OPENSCAD_EXEC:
-    # Final fallback, though likely to fail if not found above
-    OPENSCAD_EXEC = "openscad"
+    Matches offset(r=radius, $fn=segments) of the inner square: each corner
+    is a quarter circle of segments / 4 steps.
+    """
+    if radius * 2 >= min(width, height):
+        raise ValueError("radius must be less than half the card width and height.")
 
-import numpy as np
-import trimesh
+    if radius <= 0:
+        return np.array(
+            [
+                [width / 2.0, -height / 2.0],
+                [width / 2.0, height / 2.0],
+                [-width / 2.0, height / 2.0],
+                [-width / 2.0, -height / 2.0],
+            ]
+        )
 
-from QRGenerator import QRGenerator
+    steps = max(int(round(segments / 4.0)), 1)
+    angles = np.linspace(0.0, np.pi / 2.0, steps + 1)
+    arc = np.column_stack([np.cos(angles), np.sin(angles)]) * radius
+    corners = [
+        (width / 2.0 - radius, height / 2.0 - radius),
+        (-width / 2.0 + radius, height / 2.0 - radius),
+        (-width / 2.0 + radius, -height / 2.0 + radius),
+        (width / 2.0 - radius, -height / 2.0 + radius),
+    ]
+    # One quarter turn per corner
+    return np.vstack(
+        [
+            np.column_stack(
+                [
+                    cx + arc[:, 0] * np.cos(turn) - arc[:, 1] * np.sin(turn),
+                    cy + arc[:, 0] * np.sin(turn) + arc[:, 1] * np.cos(turn),
+                ]
+            )
+            for turn, (cx, cy) in zip(np.arange(4) * np.pi / 2.0, corners)
+        ]
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _rounded_slab(width, height, thickness, radius, segments):
+    """Vertices and faces of a slab with filleted corners, centered at the origin.
+
+    Matches linear_extrude(center=true) of the _rounded_outline.
+    """
+    outline = _rounded_outline(width, height, radius, segments)
+    count = len(outline)
+    vertices = np.vstack(
+        [
+            np.column_stack([outline, np.full(count, -thickness / 2.0)]),
+            np.column_stack([outline, np.full(count, thickness / 2.0)]),
+        ]
+    )
+
+    # The outline is convex, so both caps are fans from its first point.
+    index = np.arange(1, count - 1)
+    fan = np.column_stack([np.zeros(count - 2, dtype=np.int64), index, index + 1])
+    current = np.arange(count)
+    following = np.roll(current, -1)
+    faces = np.vstack(
+        [
+            fan[:, [0, 2, 1]],
+            fan + count,
+            np.column_stack([current, following, following + count]),
+            np.column_stack([current, following + count, current + count]),
+        ]
+    )
+
+    vertices.flags.writeable = False
+    faces.flags.writeable = False
+    return vertices, faces
+
+
+def _scad_string(value):
+    """Quotes a Python string as an OpenSCAD string literal."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
 
 
 class Carver:
@@ -38,12 +103,22 @@ class Carver:
         qr_border=4,
         qr_error_correction=None,
         font_path=None,
+        text_cache=None,
+        text_engine="openscad",
+        boolean_backend=None,
     ):
+        if text_engine not in {"openscad", "native"}:
+            raise ValueError("text_engine must be 'openscad' or 'native'.")
+        if text_engine == "native" and not font_path:
+            raise ValueError("The native text engine needs a font_path.")
         self.font = font
         self.font_path = font_path
+        self.text_engine = text_engine
         self.depth = depth
         self.box_extents = box_extents
         self.mesh = None
+        self.text_cache = text_cache if text_cache is not None else text_mesh_cache
+        self.boolean_backend = boolean_backend or default_boolean_backend()
         self.qr_generator = QRGenerator(
             self.box_extents,
             self.depth,
@@ -61,43 +136,17 @@ class Carver:
 
         if self.mesh is None:
             self.mesh = trimesh.creation.box(extents=self.box_extents)
-            self.mesh.split()
-
-    def _difference_openscad(self, base_mesh, subtract_mesh):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            base_path = tmp_path / "base.stl"
-            subtract_path = tmp_path / "subtract.stl"
-            result_path = tmp_path / "result.stl"
-            scad_path = tmp_path / "boolean.scad"
-
-            base_mesh.export(base_path)
-            subtract_mesh.export(subtract_path)
-
-            scad_path.write_text(
-                "\n".join(
-                    [
-                        "difference() {",
-                        f'  import("{base_path.as_posix()}");',
-                        f'  import("{subtract_path.as_posix()}");',
-                        "}",
-                    ]
-                ),
-                encoding="utf-8",
-            )
-
-            subprocess.run(
-                [OPENSCAD_EXEC, "-o", str(result_path), str(scad_path)],
-                check=True,
-            )
-
-            return trimesh.load(result_path, force="mesh")
-
 
-    
-
-
-    def fill_in_qr(self, x, y, url, module_size=None, border=None, side="top"):
+    def fill_in_qr(
+        self,
+        x,
+        y,
+        url,
+        module_size=None,
+        border=None,
+        side="top",
+        drop_internal_faces=False,
+    ):
         return self.qr_generator.build_qr_mesh(
             x,
             y,
@@ -105,6 +154,7 @@ class Carver:
             module_size=module_size,
             border=border,
             side=side,
+            drop_internal_faces=drop_internal_faces,
         )
 
     def fill_in_text(
@@ -114,184 +164,208 @@ class Carver:
         text,
         text_height,        
     ):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            result_path = tmp_path / "text.stl"
-            scad_path = tmp_path / "text.scad"
-
-            top_z = self.box_extents[2] / 2.0
-            
-            text_x = x
-            text_y = y
-            text_z = top_z - self.depth
-            
-            use_statement = ""
-            if self.font_path:
-                use_statement = f'use <{Path(self.font_path).resolve().as_posix()}>'
-
-            # Add epsilon to height for clean subtraction
-            epsilon = 0.1
-            
-            scad_path.write_text(
-                "\n".join(
-                    [
-                        use_statement,
-                        "translate(["
-                        f"{text_x}, {text_y}, {text_z}"
-                        "])",
-                        "  linear_extrude(height="
-                        f"{self.depth + epsilon}"
-                        ")",
-                        "    text("
-                        f"\"{text}\", size={text_height}, font=\"{self.font}\", halign=\"left\", valign=\"center\""
-                        ");",
-                    ]
-                ),
-                encoding="utf-8",
-            )
+        # Add epsilon to height for clean subtraction
+        epsilon = 0.1
+        return self._text_mesh(x, y, text, text_height, self.depth + epsilon)
+
+    @timed("carver.text")
+    def _text_mesh(self, x, y, text, text_height, height):
+        """Text extruded from the carve floor, served from the text cache when possible.
+
+        The outline is rendered once per string, as a unit-height extrusion
+        at the origin; each height (carve cutter, raised text) is a z-scaled
+        copy of it, placed on the card.
+        """
+        font_path = None
+        if self.font_path:
+            font_path = Path(self.font_path).resolve().as_posix()
+        key = (
+            self.text_engine,
+            text,
+            self.font,
+            font_path,
+            float(text_height),
+        )
 
-            subprocess.run(
-                [OPENSCAD_EXEC, "-o", str(result_path), str(scad_path)],
-                check=True,
-            )
+        if self.text_engine == "native":
+            render = self._render_text_native
+        else:
+            render = self._render_text
 
-            return trimesh.load(result_path, force="mesh")
-
-    def generate_rounded_base(self, radius):
-        """Generates a base box with rounded corners (XY plane) using OpenSCAD."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            result_path = tmp_path / "base_rounded.stl"
-            scad_path = tmp_path / "base_rounded.scad"
-
-            width = self.box_extents[0]
-            height = self.box_extents[1]
-            thickness = self.box_extents[2]
-            
-            # OpenSCAD script for rounded box using hull of 4 cylinders
-            # Centered at origin
-            scad_script = f"""
-            w = {width};
-            h = {height};
-            d = {thickness};
-            r = {radius};
-
-            linear_extrude(height=d)
-                offset(r=r, $fn=60)
-                    square([w-2*r, h-2*r], center=true);
-            """
-            # Note: linear_extrude in OpenSCAD by default starts at z=0 and goes to z=d. 
-            # If we want it centered in Z (which trimesh.creation.box does), we should translate it.
-            # trimesh.creation.box is centered at origin [0,0,0].
-            # So z range is [-thickness/2, thickness/2].
-            # OpenSCAD linear_extrude with center=true centers it in Z.
-            
-            scad_script = f"""
-            w = {width};
-            h = {height};
-            d = {thickness};
-            r = {radius};
-
-            linear_extrude(height=d, center=true)
-                offset(r=r, $fn=60)
-                    square([w-2*r, h-2*r], center=true);
-            """
-
-            scad_path.write_text(scad_script, encoding="utf-8")
-
-            subprocess.run(
-                [OPENSCAD_EXEC, "-o", str(result_path), str(scad_path)],
-                check=True,
-            )
+        mesh = self.text_cache.get_or_create(
+            key,
+            lambda: render(text, text_height, 1.0),
+        )
 
-            mesh = trimesh.load(result_path, force="mesh")
-            self.mesh = mesh
-            return mesh
+        top_z = self.box_extents[2] / 2.0
+        mesh.vertices = mesh.vertices * [1.0, 1.0, height] + [x, y, top_z - self.depth]
+        return mesh
+
+    def _use_statement(self):
+        if not self.font_path:
+            return ""
+        return f'use <{Path(self.font_path).resolve().as_posix()}>'
+
+    def _text_scad(self, text, text_height, height):
+        return "\n".join(
+            [
+                "linear_extrude(height="
+                f"{height}"
+                ")",
+                "  text("
+                f"{_scad_string(text)}, size={text_height}, font={_scad_string(self.font)}, halign=\"left\", valign=\"center\""
+                ");",
+            ]
+        )
+
+    def _render_text(self, text, text_height, height):
+        program = "\n".join(
+            [
+                self._use_statement(),
+                self._text_scad(text, text_height, height),
+            ]
+        )
+        return render_scad(program, "text")
+
+    def _native_text_engine(self):
+        # Imported here so the OpenSCAD engine works without fonttools/shapely.
+        from TextEngine import get_text_engine
+
+        return get_text_engine(Path(self.font_path).resolve().as_posix())
+
+    def _render_text_native(self, text, text_height, height):
+        return self._native_text_engine().text_mesh(text, text_height, height)
+
+    def _rounded_base_scad(self, radius, segments=60):
+        width = self.box_extents[0]
+        height = self.box_extents[1]
+        thickness = self.box_extents[2]
 
-    def generate_qr_cutout_mesh(self, x, y, url, module_size=None, border=None, side="top"):
-        """Generates the mesh for the QR code cutout, without subtracting it from the base."""
+        # trimesh.creation.box is centered at origin, so z range is
+        # [-thickness/2, thickness/2]; linear_extrude with center=true matches.
+        return "\n".join(
+            [
+                f"linear_extrude(height={thickness}, center=true)",
+                f"  offset(r={radius}, $fn={segments})",
+                f"    square([{width - 2 * radius}, {height - 2 * radius}], center=true);",
+            ]
+        )
+
+    def generate_rounded_base(self, radius, segments=60, native=True):
+        """Like build_rounded_base, and sets self.mesh to the base."""
+        self.mesh = self.build_rounded_base(radius, segments, native)
+        return self.mesh
+
+    @timed("carver.base")
+    def build_rounded_base(self, radius, segments=60, native=True):
+        """Builds a base box with rounded corners (XY plane).
+
+        The native path builds the slab directly and memoizes it by
+        dimensions; with native=False it is extruded by OpenSCAD.
+        segments is the number of arc segments per full circle ($fn).
+        The build_* methods leave the Carver untouched, so they can run in
+        parallel on one instance.
+        """
+        if native:
+            vertices, faces = _rounded_slab(
+                float(self.box_extents[0]),
+                float(self.box_extents[1]),
+                float(self.box_extents[2]),
+                float(radius),
+                int(segments),
+            )
+            # The memoized arrays are shared, every caller gets its own copy.
+            return trimesh.Trimesh(
+                vertices=vertices.copy(), faces=faces.copy(), process=False)
+
+        return render_scad(self._rounded_base_scad(radius, segments), "base_rounded")
+
+    def _qr_cutout_scad(self, module_rects, epsilon):
+        """Union of the module rectangles, each depth + epsilon tall; see
+        QRGenerator.iter_module_rects for where the epsilon goes."""
+        scad_lines = ["union() {"]
+        depth = self.qr_generator.depth
+        for x_min, y_min, z_min, width, height in module_rects:
+            scad_lines.append(
+                "    translate(["
+                f"{x_min}, {y_min}, {z_min}"
+                "]) cube(["
+                f"{width}, {height}, {depth + epsilon}"
+                "]);"
+            )
+        scad_lines.append("}")
+        return "\n".join(scad_lines)
+
+    def generate_qr_cutout_mesh(
+        self,
+        x,
+        y,
+        url,
+        module_size=None,
+        border=None,
+        side="top",
+        native=True,
+    ):
+        """Like build_qr_cutout_mesh, and starts self.mesh as a plain box if unset."""
         self._ensure_base_mesh(self.box_extents)
+        return self.build_qr_cutout_mesh(
+            x, y, url, module_size=module_size, border=border, side=side, native=native)
 
-        module_boxes = list(
-            self.qr_generator.iter_module_boxes(
+    @timed("carver.qr_cutout")
+    def build_qr_cutout_mesh(
+        self,
+        x,
+        y,
+        url,
+        module_size=None,
+        border=None,
+        side="top",
+        native=True,
+    ):
+        """Builds the mesh for the QR code cutout, without subtracting it from the base.
+
+        The native path builds the mesh directly from the QR matrix; with
+        native=False the merged module rectangles are unioned by OpenSCAD.
+        """
+        epsilon = 0.1
+        if native:
+            return self.qr_generator.build_cutout_mesh(
                 x,
                 y,
                 url,
+                self.qr_generator.depth + epsilon,
                 module_size=module_size,
                 border=border,
                 side=side,
             )
-        )
-        if not module_boxes:
-            raise ValueError("QR matrix has no filled modules.")
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            result_path = tmp_path / "qr_cutout.stl"
-            scad_path = tmp_path / "qr_cutout.scad"
-
-            scad_lines = ["union() {"]
-            depth = self.qr_generator.depth
-            epsilon = 0.1
-            for x_min, y_min, z_min, size in module_boxes:
-                scad_lines.append(
-                    "    translate(["
-                    f"{x_min}, {y_min}, {z_min}"
-                    "]) cube(["
-                    f"{size}, {size}, {depth + epsilon}"
-                    "]);"
-                )
-            scad_lines.append("}")
-
-            scad_path.write_text("\n".join(scad_lines), encoding="utf-8")
-
-            subprocess.run(
-                [OPENSCAD_EXEC, "-o", str(result_path), str(scad_path)],
-                check=True,
+        module_rects = list(
+            self.qr_generator.iter_module_rects(
+                x,
+                y,
+                url,
+                module_size=module_size,
+                border=border,
+                side=side,
+                margin=epsilon,
             )
+        )
+        if not module_rects:
+            raise ValueError("QR matrix has no filled modules.")
 
-            return trimesh.load(result_path, force="mesh")
+        return render_scad(self._qr_cutout_scad(module_rects, epsilon), "qr_cutout")
 
     def apply_difference(self, subtract_meshes):
         """Subtracts a list of meshes from self.mesh in a single operation."""
-        if not subtract_meshes:
-            return self.mesh
-            
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            base_path = tmp_path / "base.stl"
-            result_path = tmp_path / "result.stl"
-            scad_path = tmp_path / "boolean.scad"
-
-            self.mesh.export(base_path)
-            
-            # Export all subtract meshes
-            subtract_imports = []
-            for i, mesh in enumerate(subtract_meshes):
-                sub_path = tmp_path / f"subtract_{i}.stl"
-                mesh.export(sub_path)
-                subtract_imports.append(f'    import("{sub_path.as_posix()}");')
-
-            scad_script = [
-                "difference() {",
-                f'  import("{base_path.as_posix()}");',
-                "  union() {",
-            ]
-            scad_script.extend(subtract_imports)
-            scad_script.extend([
-                "  }",
-                "}"
-            ])
-
-            scad_path.write_text("\n".join(scad_script), encoding="utf-8")
+        self.mesh = self.difference(self.mesh, subtract_meshes)
+        return self.mesh
 
-            subprocess.run(
-                [OPENSCAD_EXEC, "-o", str(result_path), str(scad_path)],
-                check=True,
-            )
-
-            self.mesh = trimesh.load(result_path, force="mesh")
-            return self.mesh
+    @timed("carver.boolean")
+    def difference(self, mesh, subtract_meshes):
+        """Returns mesh minus a list of meshes, computed in a single operation."""
+        if not subtract_meshes:
+            return mesh
+        return self.boolean_backend.difference(mesh, subtract_meshes)
 
     def generate_raised_text_mesh(
         self,
@@ -302,46 +376,126 @@ class Carver:
         extra_height=0.4,
     ):
         """Generates a text mesh that is deeper/taller than the carve depth, so it protrudes."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            result_path = tmp_path / "text_raised.stl"
-            scad_path = tmp_path / "text_raised.scad"
-
-            top_z = self.box_extents[2] / 2.0
-            
-            text_x = x
-            text_y = y
-            # Start at the same Z level as the carved hole bottom
-            text_z = top_z - self.depth
-            
-            # Total height = depth of hole + extra raise amount
-            total_height = self.depth + extra_height
-            
-            use_statement = ""
-            if self.font_path:
-                use_statement = f'use <{Path(self.font_path).resolve().as_posix()}>'
-
-            scad_path.write_text(
-                "\n".join(
-                    [
-                        use_statement,
-                        "translate(["
-                        f"{text_x}, {text_y}, {text_z}"
-                        "])",
-                        "  linear_extrude(height="
-                        f"{total_height}"
-                        ")",
-                        "    text("
-                        f"\"{text}\", size={text_height}, font=\"{self.font}\", halign=\"left\", valign=\"center\""
-                        ");",
-                    ]
-                ),
-                encoding="utf-8",
+        # Starts at the same Z level as the carved hole bottom;
+        # total height = depth of hole + extra raise amount
+        return self._text_mesh(
+            x, y, text, text_height, self.depth + extra_height)
+
+    def render_card(self, radius, text_fields, qr=None, extra_height=0.4):
+        """Like build_card, and sets self.mesh to the body."""
+        body, text_meshes = self.build_card(radius, text_fields, qr, extra_height)
+        self.mesh = body
+        return body, text_meshes
+
+    @timed("carver.single_pass")
+    def build_card(self, radius, text_fields, qr=None, extra_height=0.4):
+        """Renders the carved base and the raised text in a single OpenSCAD call.
+
+        text_fields is a list of (x, y, text, text_height) tuples and qr an
+        optional (x, y, url, side) tuple. Returns the carved body and one
+        raised text mesh per field.
+        """
+        top_z = self.box_extents[2] / 2.0
+        text_z = top_z - self.depth
+        # Add epsilon to height for clean subtraction
+        epsilon = 0.1
+
+        # OpenSCAD writes a single mesh, so every part is rendered in its own
+        # band along Z and the result is split by face height afterwards.
+        # Each part lies within [-top_z, top_z + extra_height].
+        stride = self.box_extents[2] + extra_height + 1.0
+
+        cutters = []
+        for x, y, text, text_height in text_fields:
+            cutters.append(f"translate([{x}, {y}, {text_z}])")
+            cutters.append(self._text_scad(text, text_height, self.depth + epsilon))
+        if qr is not None:
+            qr_x, qr_y, url, side = qr
+            module_rects = list(
+                self.qr_generator.iter_module_rects(
+                    qr_x, qr_y, url, side=side, margin=epsilon)
             )
-
-            subprocess.run(
-                [OPENSCAD_EXEC, "-o", str(result_path), str(scad_path)],
-                check=True,
-            )
-
-            return trimesh.load(result_path, force="mesh")
+            if not module_rects:
+                raise ValueError("QR matrix has no filled modules.")
+            cutters.append(self._qr_cutout_scad(module_rects, epsilon))
+
+        scad_lines = [
+            self._use_statement(),
+            "difference() {",
+            self._rounded_base_scad(radius),
+            *cutters,
+            "}",
+        ]
+        for band, (x, y, text, text_height) in enumerate(text_fields, start=1):
+            scad_lines.append(f"translate([{x}, {y}, {text_z + band * stride}])")
+            scad_lines.append(
+                self._text_scad(text, text_height, self.depth + extra_height))
+
+        card = render_scad("\n".join(scad_lines), "card")
+
+        bands = np.floor((card.triangles_center[:, 2] + top_z) / stride).astype(int)
+        parts = []
+        for band in range(len(text_fields) + 1):
+            faces = np.flatnonzero(bands == band)
+            if len(faces):
+                part = card.submesh([faces], append=True)
+                part.apply_translation([0.0, 0.0, -band * stride])
+            else:
+                part = trimesh.Trimesh()
+            parts.append(part)
+
+        return parts[0], parts[1:]
+
+    def carve_planar(self, radius, text_fields, qr=None, segments=60):
+        """Like build_planar_body, and sets self.mesh to the body."""
+        self.mesh = self.build_planar_body(radius, text_fields, qr, segments)
+        return self.mesh
+
+    @timed("carver.planar_carve")
+    def build_planar_body(self, radius, text_fields, qr=None, segments=60):
+        """Carves the text and QR pockets into the rounded base without any 3D boolean.
+
+        The footprints are subtracted from the outline in 2D and the slab is
+        built from the resulting cells (see PlanarCarver). text_fields is a
+        list of (x, y, text, text_height) tuples and qr an optional
+        (x, y, url, side) tuple. The OpenSCAD text engine has no 2D
+        outlines, so with it the text pockets are cut afterwards with one
+        boolean (the QR code, by far the most pockets, stays planar).
+        Returns the carved body.
+        """
+        # shapely is only needed by planar carving.
+        from shapely.affinity import translate
+        from shapely.geometry import Polygon, box
+
+        from PlanarCarver import carve_slab
+
+        native_text = self.text_engine == "native"
+        if native_text and not self.font_path and text_fields:
+            raise ValueError("Planar carving needs a font_path.")
+
+        width, height, thickness = (float(value) for value in self.box_extents)
+        outline = Polygon(_rounded_outline(width, height, float(radius), int(segments)))
+
+        top = []
+        bottom = []
+        if text_fields and native_text:
+            engine = self._native_text_engine()
+            for x, y, text, text_height in text_fields:
+                top.append(translate(engine.text_outline(text, text_height), x, y))
+
+        if qr is not None:
+            qr_x, qr_y, url, side = qr
+            module_rects = [
+                box(x_min, y_min, x_min + rect_width, y_min + rect_height)
+                for x_min, y_min, _, rect_width, rect_height in self.qr_generator.iter_module_rects(
+                    qr_x, qr_y, url, side=side)
+            ]
+            if not module_rects:
+                raise ValueError("QR matrix has no filled modules.")
+            (top if side == "top" else bottom).extend(module_rects)
+
+        vertices, faces = carve_slab(outline, thickness, self.depth, top, bottom)
+        body = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+        if text_fields and not native_text:
+            body = self.difference(body, [self.fill_in_text(*field) for field in text_fields])
+        return body
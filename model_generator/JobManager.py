@@ -0,0 +1,214 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+def _job_main(conn, target, args):
+    """Runs in the job's process: target(*args, progress=...) and reports back."""
+    if hasattr(os, "setpgrp"):
+        # Own process group, so a cancel can kill OpenSCAD children with us.
+        os.setpgrp()
+
+    def progress(stage, state):
+        conn.send(("progress", stage, state))
+
+    try:
+        conn.send(("done", target(*args, progress=progress)))
+    except BaseException as exc:
+        conn.send(("failed", f"{type(exc).__name__}: {exc}"))
+    finally:
+        conn.close()
+
+
+class Job:
+    def __init__(self, stages):
+        self.id = uuid.uuid4().hex
+        self.state = QUEUED
+        self.stages = OrderedDict((stage, "pending") for stage in stages)
+        self.error = None
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+        self.process = None
+        self.target = None
+
+    def status(self):
+        done = sum(1 for state in self.stages.values() if state == "done")
+        return {
+            "id": self.id,
+            "state": self.state,
+            "progress": done / len(self.stages) if self.stages else 0.0,
+            "stages": [
+                {"name": name, "state": state} for name, state in self.stages.items()
+            ],
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobManager:
+    """Runs jobs in worker processes, at most workers at a time.
+
+    Each job gets a fresh process (forked from a preloaded fork server where
+    the platform has one), leading its own process group: cancelling a
+    running job kills the group, including any OpenSCAD subprocess. Results
+    of finished jobs are kept for result_ttl seconds.
+    """
+
+    def __init__(self, workers, result_ttl, max_active, preload=()):
+        self.result_ttl = result_ttl
+        self.max_active = max_active
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="job")
+
+        methods = multiprocessing.get_all_start_methods()
+        if "forkserver" in methods:
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(list(preload))
+        else:
+            self._context = multiprocessing.get_context("spawn")
+
+    def _expire(self):
+        deadline = time.time() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.state in FINISHED_STATES and job.finished < deadline:
+                del self._jobs[job_id]
+
+    def submit(self, target, args, stages, hold=False):
+        """Queues target(*args, progress=callback) and returns the Job.
+
+        target must be picklable by reference (a module-level function) and
+        return the job's result. With hold, the job stays queued until
+        start(job) is called. Raises RuntimeError when max_active jobs are
+        already queued or running.
+        """
+        job = Job(stages)
+        with self._lock:
+            self._expire()
+            active = sum(1 for other in self._jobs.values() if other.state in (QUEUED, RUNNING))
+            if active >= self.max_active:
+                raise RuntimeError("Too many queued jobs.")
+            self._jobs[job.id] = job
+        job.target = (target, args)
+        if not hold:
+            self.start(job)
+        return job
+
+    def start(self, job):
+        """Runs a job submitted with hold; returns a future that is done when
+        the job has finished (at once if it was cancelled meanwhile)."""
+        return self._executor.submit(self._run, job, *job.target)
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job; forgets a finished one.
+
+        The job is cancelled on return, even though a running job's process
+        may still be exiting. Returns False if there is no such job.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if job.state in FINISHED_STATES:
+                del self._jobs[job_id]
+                return True
+            job.cancel_requested = True
+            job.state = CANCELLED
+            job.finished = time.time()
+            process = job.process
+        if process is not None:
+            self._kill(process)
+        return True
+
+    @staticmethod
+    def _kill(process):
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+                return
+            except ProcessLookupError:
+                # Not yet a group leader (or already gone).
+                pass
+        process.kill()
+
+    def _run(self, job, target, args):
+        with self._lock:
+            if job.state != QUEUED:
+                return
+            receiver, sender = self._context.Pipe(duplex=False)
+            process = self._context.Process(
+                target=_job_main, args=(sender, target, args), daemon=True)
+            job.process = process
+            job.state = RUNNING
+            job.started = time.time()
+            process.start()
+        sender.close()
+
+        outcome = None
+        try:
+            while True:
+                try:
+                    message = receiver.recv()
+                except EOFError:
+                    break
+                if message[0] == "progress":
+                    _, stage, state = message
+                    with self._lock:
+                        if not job.cancel_requested:
+                            job.stages[stage] = state
+                else:
+                    outcome = message
+        finally:
+            receiver.close()
+            process.join()
+
+        with self._lock:
+            job.process = None
+            if job.cancel_requested:
+                # cancel() has already marked the job cancelled.
+                return
+            job.finished = time.time()
+            if outcome is None:
+                job.state = FAILED
+                job.error = f"Worker exited with code {process.exitcode}."
+            elif outcome[0] == "done":
+                job.state = DONE
+                job.result = outcome[1]
+            else:
+                job.state = FAILED
+                job.error = outcome[1]
+        if job.state == FAILED:
+            logger.warning("Job %s failed: %s", job.id, job.error)
+
+    def stats(self):
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING, *FINISHED_STATES)}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+            return counts
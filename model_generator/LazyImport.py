@@ -0,0 +1,54 @@
+import importlib
+import threading
+
+
+class LazyImport:
+    """Stands for a module, or a name in a module, and imports it on first use.
+
+    Attribute access and calls are forwarded to the imported object:
+
+        np = LazyImport("numpy")
+        export_3mf = LazyImport("ThreeMFWriter", "export_3mf")
+
+    Python's own importlib.util.LazyLoader does not help here: an `import`
+    statement elsewhere reads the module's __spec__, which loads it.
+    """
+
+    def __init__(self, module, attribute=None):
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Imports the module if needed and returns the object it stands for."""
+        target = self._target
+        if target is None:
+            with self._lock:
+                if self._target is None:
+                    module = importlib.import_module(self._module)
+                    self._target = (
+                        module if self._attribute is None
+                        else getattr(module, self._attribute)
+                    )
+                target = self._target
+        return target
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            # Our own attributes before __init__ ran (copy, pickle) and
+            # dunder lookups do not trigger the import.
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        name = self._module if self._attribute is None else f"{self._module}.{self._attribute}"
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyImport {name} ({state})>"
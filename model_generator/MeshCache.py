@@ -0,0 +1,93 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class MeshCache:
+    """Bounded LRU cache of trimesh objects, evicted by memory footprint."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _footprint(mesh):
+        return mesh.vertices.nbytes + mesh.faces.nbytes
+
+    @staticmethod
+    def _copy(mesh):
+        # Imported here so the server starts without loading trimesh.
+        import trimesh
+
+        # Only the raw arrays are kept, so derived trimesh caches
+        # (normals, adjacency, ...) never count against the budget.
+        return trimesh.Trimesh(
+            vertices=mesh.vertices.copy(),
+            faces=mesh.faces.copy(),
+            process=False,
+        )
+
+    def get(self, key):
+        """Returns a private copy of the cached mesh, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._copy(entry[0])
+
+    def put(self, key, mesh):
+        stored = self._copy(mesh)
+        size = self._footprint(stored)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (stored, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_create(self, key, factory):
+        """Returns a copy of the cached mesh, building it with factory() on a miss."""
+        mesh = self.get(key)
+        if mesh is not None:
+            return mesh
+        mesh = factory()
+        self.put(key, mesh)
+        return mesh
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Text extrusions are shared by every Carver in the process: the same names,
+# titles and domains come in again and again. Kept here rather than in
+# Carver, so reading its stats does not load numpy and trimesh.
+TEXT_CACHE_MAX_BYTES = int(
+    os.environ.get("CARVER_TEXT_CACHE_BYTES", 64 * 1024 * 1024))
+text_mesh_cache = MeshCache(TEXT_CACHE_MAX_BYTES)
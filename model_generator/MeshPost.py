@@ -0,0 +1,256 @@
+import logging
+import time
+
+import numpy as np
+import trimesh
+
+logger = logging.getLogger(__name__)
+
+# Vertices closer than this (mm, per axis) are welded into one.
+WELD_TOLERANCE = 1e-5
+# Adjacent faces whose normals differ by less than this (radians) are
+# treated as coplanar.
+COPLANAR_ANGLE = 1e-5
+
+
+def _unique_rows(rows):
+    """np.unique(rows, axis=0) for integer rows, returning (first_index,
+    inverse, counts), with a lexsort that is much faster than numpy's
+    structured-array path."""
+    order = np.lexsort(rows.T[::-1])
+    ordered = rows[order]
+    starts = np.ones(len(rows), dtype=bool)
+    starts[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    group = np.cumsum(starts) - 1
+    inverse = np.empty(len(rows), dtype=np.int64)
+    inverse[order] = group
+    first = order[starts]
+    counts = np.diff(np.append(np.flatnonzero(starts), len(rows)))
+    return first, inverse, counts
+
+
+def weld_vertices(vertices, faces, tolerance=WELD_TOLERANCE):
+    """Merges vertices that fall in the same tolerance grid cell.
+
+    Boolean kernels keep coincident vertices apart on purpose where solids
+    only touch (e.g. diagonal QR modules); vertices whose merge would give
+    an edge more than two faces are left as they were.
+    """
+    first, inverse, _ = _unique_rows(np.round(vertices / tolerance).astype(np.int64))
+    welded = inverse[faces]
+
+    edges = np.sort(welded[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edge_first, _, counts = _unique_rows(edges)
+    pinched = np.unique(edges[edge_first[counts > 2]])
+    if not len(pinched):
+        return vertices[first], welded
+
+    restore = np.isin(inverse, pinched)
+    inverse[restore] = len(first) + np.arange(np.count_nonzero(restore))
+    return np.vstack([vertices[first], vertices[restore]]), inverse[faces]
+
+
+def drop_degenerate_faces(faces):
+    """Drops faces that repeat a vertex and exact duplicates of another face."""
+    faces = faces[
+        (faces[:, 0] != faces[:, 1])
+        & (faces[:, 1] != faces[:, 2])
+        & (faces[:, 2] != faces[:, 0])
+    ]
+    # Rotate each face to start at its smallest index (keeping its
+    # winding), so duplicates compare equal.
+    start = np.argmin(faces, axis=1)
+    order = (start[:, np.newaxis] + np.arange(3)) % 3
+    canonical = np.take_along_axis(faces, order, axis=1)
+    first, _, _ = _unique_rows(canonical)
+    return faces[np.sort(first)]
+
+
+def drop_unused_vertices(vertices, faces):
+    used, inverse = np.unique(faces, return_inverse=True)
+    return vertices[used], inverse.reshape(-1, 3)
+
+
+def _coplanar_groups(vertices, faces):
+    """Labels faces so that edge-connected coplanar faces share a label."""
+    mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+    pairs = mesh.face_adjacency
+    normals = mesh.face_normals
+    coplanar = np.einsum("ij,ij->i", normals[pairs[:, 0]], normals[pairs[:, 1]])
+    pairs = pairs[coplanar > np.cos(COPLANAR_ANGLE)]
+
+    # Label propagation with pointer jumping: every face ends up labelled
+    # with the smallest face index of its group.
+    labels = np.arange(len(faces))
+    while True:
+        smallest = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, pairs[:, 0], smallest)
+        np.minimum.at(updated, pairs[:, 1], smallest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels, normals
+        labels = updated
+
+
+def _boundary_loops(group_faces):
+    """Boundary loops of a patch of faces as lists of vertex indices, or None
+    if the boundary is not a set of simple loops."""
+    edges = group_faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    edge_set = set(map(tuple, edges.tolist()))
+    following = {}
+    for start, end in edge_set:
+        if (end, start) in edge_set:
+            continue
+        if start in following:
+            # Two boundary loops touch at this vertex.
+            return None
+        following[start] = end
+
+    loops = []
+    while following:
+        start, current = following.popitem()
+        loop = [start]
+        while current != start:
+            loop.append(current)
+            current = following.pop(current, None)
+            if current is None:
+                return None
+        loops.append(loop)
+    return loops
+
+
+def _retriangulate(vertices, group_faces, normal):
+    """Triangulates a planar patch from its boundary alone.
+
+    Returns the new faces, or None if the patch cannot be re-triangulated
+    safely (then it is kept as it is).
+    """
+    # Imported here so the weld-only path works without shapely.
+    import shapely
+    from shapely.geometry import Polygon
+
+    loops = _boundary_loops(group_faces)
+    if not loops:
+        return None
+
+    # In-plane basis with u x v = normal, so counter-clockwise in 2D is
+    # the winding of the patch.
+    axis = np.eye(3)[np.argmin(np.abs(normal))]
+    u = np.cross(normal, axis)
+    u /= np.linalg.norm(u)
+    v = np.cross(normal, u)
+
+    shells = []
+    holes = []
+    point_ids = {}
+    for loop in loops:
+        points = vertices[loop] @ np.column_stack([u, v])
+        x, y = points[:, 0], points[:, 1]
+        area = 0.5 * np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)
+        (shells if area > 0 else holes).append(points)
+        for index, point in zip(loop, points.tolist()):
+            point_ids[tuple(point)] = index
+    if len(shells) != 1 or len(point_ids) != sum(len(loop) for loop in loops):
+        return None
+
+    polygon = Polygon(shells[0], holes)
+    if not polygon.is_valid:
+        return None
+    corners = shapely.get_coordinates(
+        shapely.constrained_delaunay_triangles(polygon)).reshape(-1, 4, 2)[:, :3]
+    # Exactly these many triangles when only the boundary points are used.
+    if len(corners) != len(point_ids) + 2 * len(holes) - 2:
+        return None
+    try:
+        triangles = np.array(
+            [point_ids[tuple(point)] for point in corners.reshape(-1, 2).tolist()],
+            dtype=np.int64,
+        ).reshape(-1, 3)
+    except KeyError:
+        return None
+
+    edge_a = corners[:, 1] - corners[:, 0]
+    edge_b = corners[:, 2] - corners[:, 0]
+    clockwise = (edge_a[:, 0] * edge_b[:, 1] - edge_a[:, 1] * edge_b[:, 0]) < 0
+    triangles[clockwise] = triangles[clockwise][:, ::-1]
+    return triangles
+
+
+def merge_coplanar_faces(vertices, faces):
+    """Re-triangulates every patch of coplanar faces from its boundary,
+    dropping the vertices inside it.
+
+    Boundary vertices are all kept, including collinear ones, so the
+    patch still meets its neighbours edge to edge.
+    """
+    labels, normals = _coplanar_groups(vertices, faces)
+
+    # Only patches with vertices inside them can lose triangles: a patch
+    # triangulated from its boundary alone has 2 fewer triangles per
+    # interior vertex. A vertex is interior if it is not on a boundary
+    # edge (an edge of the patch without the opposite edge in the patch).
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edge_labels = np.repeat(labels, 3)
+    keyed = np.column_stack([edge_labels, edges])
+    edge_first, _, counts = _unique_rows(keyed)
+    boundary = keyed[edge_first[counts == 1]]
+    boundary_vertices = np.column_stack(
+        [np.repeat(boundary[:, 0], 2), boundary[:, 1:].ravel()])
+    boundary_vertices = boundary_vertices[_unique_rows(boundary_vertices)[0]]
+    patch_vertices = np.column_stack([np.repeat(labels, 3), faces.ravel()])
+    patch_vertices = patch_vertices[_unique_rows(patch_vertices)[0]]
+    interior = np.bincount(patch_vertices[:, 0], minlength=len(faces)) - np.bincount(
+        boundary_vertices[:, 0], minlength=len(faces))
+    candidates = interior[labels] > 0
+
+    order = np.flatnonzero(candidates)[np.argsort(labels[candidates], kind="stable")]
+    groups = np.split(order, np.flatnonzero(np.diff(labels[order])) + 1)
+
+    keep = np.ones(len(faces), dtype=bool)
+    added = []
+    for group in groups:
+        if len(group) < 3:
+            continue
+        triangles = _retriangulate(vertices, faces[group], normals[group[0]])
+        if triangles is None or len(triangles) >= len(group):
+            continue
+        keep[group] = False
+        added.append(triangles)
+    return np.vstack([faces[keep], *added])
+
+
+def postprocess_mesh(mesh, merge_coplanar=False):
+    """Welds, cleans and optionally merges coplanar faces of a mesh.
+
+    The fast path (merge_coplanar=False) only welds vertices and drops
+    degenerate and duplicate faces. Returns (mesh, stats) with the triangle
+    and byte counts before and after.
+    """
+    start = time.perf_counter()
+    vertices = np.asarray(mesh.vertices, dtype=float)
+    faces = np.asarray(mesh.faces, dtype=np.int64)
+    stats = {
+        "triangles_before": len(faces),
+        "bytes_before": vertices.nbytes + faces.nbytes,
+    }
+
+    if len(faces):
+        vertices, faces = weld_vertices(vertices, faces)
+        faces = drop_degenerate_faces(faces)
+        if merge_coplanar and len(faces):
+            faces = merge_coplanar_faces(vertices, faces)
+        vertices, faces = drop_unused_vertices(vertices, faces)
+
+    stats["triangles_after"] = len(faces)
+    stats["bytes_after"] = vertices.nbytes + faces.nbytes
+    stats["seconds"] = time.perf_counter() - start
+    logger.debug(
+        "Post-processed mesh: %d -> %d triangles, %d -> %d bytes in %.3fs",
+        stats["triangles_before"],
+        stats["triangles_after"],
+        stats["bytes_before"],
+        stats["bytes_after"],
+        stats["seconds"],
+    )
+    return trimesh.Trimesh(vertices=vertices, faces=faces, process=False), stats
@@ -0,0 +1,236 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the duration histogram buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Type and help text of every metric recorded through this module.
+METRICS = {
+    "card_stage_seconds": ("histogram", "Time spent per card pipeline stage."),
+    "card_http_request_seconds": (
+        "histogram", "HTTP request duration by route, up to the end of the body."),
+    "card_openscad_processes_total": (
+        "counter", "OpenSCAD processes run, by call label and outcome."),
+    "card_openscad_program_bytes_total": (
+        "counter", "Size of the SCAD programs passed to OpenSCAD."),
+    "card_cards_total": ("counter", "Cards built, by render mode."),
+    "card_triangles_total": ("counter", "Triangles in the built cards."),
+    "card_output_bytes_total": ("counter", "Bytes of generated files sent to clients."),
+    "card_outputs_total": ("counter", "Generated files sent to clients."),
+    "card_admission_total": (
+        "counter", "Generation requests admitted or turned away, by outcome."),
+    "card_preview_rejected_total": (
+        "counter", "Preview requests turned away because the preview queue was full."),
+    "card_postprocess_triangles_removed_total": (
+        "counter", "Triangles removed by mesh post-processing."),
+    "card_postprocess_bytes_removed_total": (
+        "counter", "Vertex and face array bytes removed by mesh post-processing."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+# Stage timings of the request being served: {stage: [seconds, count]}, or
+# None outside of a request.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name, value=1, **labels):
+    """Adds value to the counter name{labels}."""
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Records value in the duration histogram name{labels}."""
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(DURATION_BUCKETS), 0.0, 0]
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram[0][index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def record_output(size, **labels):
+    """Counts one generated file of size bytes sent to a client."""
+    increment("card_output_bytes_total", size, **labels)
+    increment("card_outputs_total", **labels)
+
+
+def counter_value(name, **labels):
+    with _lock:
+        return _counters.get((name, _label_key(labels)), 0)
+
+
+def histogram_totals(name, **labels):
+    """(count, sum) of the histogram name{labels}."""
+    with _lock:
+        histogram = _histograms.get((name, _label_key(labels)))
+        if histogram is None:
+            return 0, 0.0
+        return histogram[2], histogram[1]
+
+
+def record_stage(stage, seconds):
+    """Adds a stage timing to the histograms and to the current request's Server-Timing."""
+    observe("card_stage_seconds", seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        with _lock:
+            entry = timings.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+
+@contextmanager
+def timed(stage):
+    """Times the block (or, as a decorator, each call) as stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def meter_stream(chunks, stage, **labels):
+    """Passes chunks through, timing their production as stage and counting
+    the output with record_output(**labels)."""
+    producing = 0.0
+    size = 0
+    try:
+        iterator = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                producing += time.perf_counter() - start
+                break
+            producing += time.perf_counter() - start
+            size += len(chunk)
+            yield chunk
+    finally:
+        record_stage(stage, producing)
+        record_output(size, **labels)
+
+
+def server_timing(timings, total=None):
+    """Formats {stage: [seconds, count]} as a Server-Timing header value."""
+    entries = []
+    with _lock:
+        items = [(stage, seconds, count) for stage, (seconds, count) in timings.items()]
+    for stage, seconds, count in items:
+        entry = f"{stage};dur={seconds * 1000.0:.1f}"
+        if count > 1:
+            entry += f';desc="{count} calls"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f"total;dur={total * 1000.0:.1f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware collecting the stage timings of each HTTP request.
+
+    They are sent as a Server-Timing header (up to the start of the
+    response, so a streamed body is only in /metrics) and the request
+    duration goes to card_http_request_seconds by route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                value = server_timing(timings, time.perf_counter() - start)
+                message = dict(message)
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"server-timing", value.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            observe(
+                "card_http_request_seconds",
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "other"),
+            )
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (
+        '%s="%s"' % (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{%s}" % ",".join(escaped)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render_prometheus(extra=()):
+    """All metrics in the Prometheus text exposition format.
+
+    extra are (name, kind, help, samples) families computed at scrape time,
+    samples being (labels dict, value) pairs.
+    """
+    families = {}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            families.setdefault(name, []).append(
+                "%s%s %s" % (name, _format_labels(labels), _format_value(value)))
+        for (name, labels), (buckets, total, count) in _histograms.items():
+            lines = families.setdefault(name, [])
+            for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                lines.append(
+                    "%s_bucket%s %d" % (name, _format_labels(labels, [("le", repr(bound))]), bucket))
+            lines.append("%s_bucket%s %d" % (name, _format_labels(labels, [("le", "+Inf")]), count))
+            lines.append("%s_sum%s %r" % (name, _format_labels(labels), total))
+            lines.append("%s_count%s %d" % (name, _format_labels(labels), count))
+
+    output = []
+    for name in sorted(families):
+        kind, help_text = METRICS.get(name, ("untyped", ""))
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(families[name])
+    for name, kind, help_text, samples in extra:
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            output.append(
+                "%s%s %s" % (name, _format_labels(_label_key(labels)), _format_value(value)))
+    return "\n".join(output) + "\n"
@@ -0,0 +1,252 @@
+import functools
+import io
+import logging
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import os
+from pathlib import Path
+
+import shutil
+import platform
+
+from Metrics import increment, timed
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def openscad_exec():
+    """Path of the OpenSCAD executable, looked up on first use."""
+    executable = os.environ.get("OPENSCAD_EXEC")
+
+    if not executable:
+        # Try finding it in path
+        executable = shutil.which("openscad")
+
+    if not executable and platform.system() == "Windows":
+        # Fallback to default Windows install location
+        default_win_path = Path("C:/Program Files/OpenSCAD/openscad.exe")
+        if default_win_path.exists():
+            executable = str(default_win_path)
+
+    if not executable:
+        # Final fallback, though likely to fail if not found above
+        executable = "openscad"
+    return executable
+
+
+# Upper bound on concurrently running OpenSCAD processes in this process.
+OPENSCAD_MAX_PROCS = int(
+    os.environ.get("OPENSCAD_MAX_PROCS", os.cpu_count() or 1))
+_openscad_slots = threading.BoundedSemaphore(OPENSCAD_MAX_PROCS)
+
+
+def _default_workspace():
+    # tmpfs keeps the exchanged files in RAM: no fsync, no disk inodes.
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
+
+# Directory for the files that cannot go through a pipe (meshes imported by
+# a program, results of OpenSCAD builds without stdout export). None means
+# the system temp directory.
+OPENSCAD_WORKSPACE = os.environ.get("OPENSCAD_WORKSPACE") or _default_workspace()
+# "auto" pipes the program through stdin and the result through stdout when
+# the OpenSCAD build supports it, "1" forces pipes, "0" always uses files.
+# Files by default: pipes are opt-in until benchmark.py --check-volumes has
+# passed against real OpenSCAD builds.
+OPENSCAD_PIPES = os.environ.get("OPENSCAD_PIPES", "0")
+# Format of the rendered result: "stl" (ASCII STL, what OpenSCAD exports by
+# default), "binstl", "off", or "auto" for binstl when OpenSCAD can export
+# it and OFF otherwise. The other formats are opt-in like the pipes.
+OPENSCAD_RESULT_FORMAT = os.environ.get("OPENSCAD_RESULT_FORMAT", "stl")
+
+_stats_lock = threading.Lock()
+_totals = {
+    "calls": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "io_seconds": 0.0,
+    "run_seconds": 0.0,
+}
+
+
+@functools.lru_cache(maxsize=1)
+def openscad_version():
+    """(year, month) of the OpenSCAD build, or None if it cannot be determined."""
+    try:
+        completed = subprocess.run(
+            [openscad_exec(), "--version"],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"(\d{4})\.(\d{1,2})", completed.stdout + completed.stderr)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def _supports_stdio():
+    if OPENSCAD_PIPES != "auto":
+        return OPENSCAD_PIPES == "1"
+    # "-" as input file and "-o -" with --export-format arrived in 2021.01.
+    version = openscad_version()
+    return version is not None and version >= (2021, 1)
+
+
+def _result_format():
+    if OPENSCAD_RESULT_FORMAT != "auto":
+        if OPENSCAD_RESULT_FORMAT not in ("stl", "binstl", "off"):
+            raise ValueError(
+                f"Unsupported OpenSCAD result format: {OPENSCAD_RESULT_FORMAT!r}")
+        return OPENSCAD_RESULT_FORMAT
+    version = openscad_version()
+    if version is not None and version >= (2021, 1):
+        return "binstl"
+    return "off"
+
+
+def _encode_mesh(mesh):
+    """Encodes mesh as binary STL, which every OpenSCAD build imports.
+
+    Returns (data, extension).
+    """
+    import trimesh
+
+    return trimesh.exchange.stl.export_stl(mesh), "stl"
+
+
+def exchange_stats():
+    """Totals over every OpenSCAD call in this process."""
+    with _stats_lock:
+        return dict(_totals)
+
+
+class OpenSCADExchange:
+    """One OpenSCAD call with its inputs and result kept off the disk.
+
+    The program goes through stdin and the result comes back through
+    stdout when the build supports it; meshes the program imports are
+    written to a private directory under OPENSCAD_WORKSPACE, which is only
+    created when needed. Bytes exchanged and time spent are recorded in
+    stats and added to exchange_stats().
+
+        with OpenSCADExchange("boolean") as exchange:
+            path = exchange.add_mesh(base_mesh)
+            mesh = exchange.render(f'import("{path}");')
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.stats = {
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "io_seconds": 0.0,
+            "run_seconds": 0.0,
+        }
+        self._tmpdir = None
+        self._inputs = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+        with _stats_lock:
+            _totals["calls"] += 1
+            for key, value in self.stats.items():
+                _totals[key] += value
+        logger.debug(
+            "OpenSCAD %s: %d bytes in, %d bytes out, %.3fs I/O, %.3fs run",
+            self.label,
+            self.stats["bytes_in"],
+            self.stats["bytes_out"],
+            self.stats["io_seconds"],
+            self.stats["run_seconds"],
+        )
+
+    def _workdir(self):
+        if self._tmpdir is None:
+            self._tmpdir = tempfile.TemporaryDirectory(
+                prefix="openscad-", dir=OPENSCAD_WORKSPACE)
+        return Path(self._tmpdir.name)
+
+    def add_mesh(self, mesh):
+        """Writes mesh for the program to import() and returns its path."""
+        start = time.perf_counter()
+        with timed("mesh_encode"):
+            data, extension = _encode_mesh(mesh)
+        path = self._workdir() / f"input_{self._inputs}.{extension}"
+        self._inputs += 1
+        path.write_bytes(data)
+        self.stats["bytes_in"] += len(data)
+        self.stats["io_seconds"] += time.perf_counter() - start
+        return path.as_posix()
+
+    def _run(self, command, **kwargs):
+        """Runs one OpenSCAD process, counted and timed under this call's label."""
+        outcome = "failed"
+        try:
+            with _openscad_slots, timed(f"openscad.{self.label}"):
+                start = time.perf_counter()
+                completed = subprocess.run(command, check=True, **kwargs)
+                self.stats["run_seconds"] += time.perf_counter() - start
+            outcome = "ok"
+            return completed
+        finally:
+            increment("card_openscad_processes_total", label=self.label, outcome=outcome)
+
+    def render(self, program):
+        """Runs the SCAD program text and returns the resulting mesh."""
+        data = program.encode("utf-8")
+        result_format = _result_format()
+        self.stats["bytes_in"] += len(data)
+        increment("card_openscad_program_bytes_total", len(data), label=self.label)
+
+        if _supports_stdio():
+            command = [openscad_exec(), "--export-format", result_format, "-o", "-", "-"]
+            result = self._run(command, input=data, stdout=subprocess.PIPE).stdout
+        else:
+            start = time.perf_counter()
+            workdir = self._workdir()
+            scad_path = workdir / f"{self.label}.scad"
+            result_path = workdir / f"{self.label}.{'off' if result_format == 'off' else 'stl'}"
+            scad_path.write_bytes(data)
+            self.stats["io_seconds"] += time.perf_counter() - start
+
+            command = [openscad_exec(), "-o", str(result_path), str(scad_path)]
+            if result_format == "binstl":
+                command[1:1] = ["--export-format", "binstl"]
+            self._run(command)
+
+            start = time.perf_counter()
+            result = result_path.read_bytes()
+            self.stats["io_seconds"] += time.perf_counter() - start
+
+        import trimesh
+
+        start = time.perf_counter()
+        self.stats["bytes_out"] += len(result)
+        with timed("mesh_decode"):
+            mesh = trimesh.load(
+                io.BytesIO(result),
+                file_type="off" if result_format == "off" else "stl",
+                force="mesh",
+            )
+        self.stats["io_seconds"] += time.perf_counter() - start
+        return mesh
+
+
+def render_scad(program, label="model"):
+    """Runs a self-contained SCAD program and returns the resulting mesh."""
+    with OpenSCADExchange(label) as exchange:
+        return exchange.render(program)
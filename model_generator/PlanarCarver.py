@@ -0,0 +1,149 @@
+import numpy as np
+
+try:
+    import shapely
+    from shapely.geometry import Polygon
+    from shapely.geometry.polygon import orient
+    from shapely.ops import polygonize, unary_union
+except ModuleNotFoundError as exc:
+    raise RuntimeError(
+        "Missing dependency: shapely. Install with `pip install shapely`."
+    ) from exc
+
+# Footprints that only touch at a corner (diagonal QR modules, pixel glyphs)
+# would leave a pinched, non-manifold edge in the pocket walls; growing them
+# by this much (mm) joins such corners.
+PINCH_EPSILON = 1e-4
+
+
+def _footprint(shapes, outline):
+    shapes = [shape for shape in shapes if shape is not None and not shape.is_empty]
+    if not shapes:
+        return None
+    region = unary_union(shapes).buffer(PINCH_EPSILON, join_style="mitre")
+    region = region.intersection(outline)
+    if region.is_empty:
+        return None
+    return region
+
+
+def carve_slab(outline, thickness, depth, top=(), bottom=()):
+    """Builds a slab of the given outline with pockets carved from its faces.
+
+    outline is a shapely Polygon in the XY plane; top and bottom are
+    sequences of shapely geometries cut depth deep into the face at
+    z=thickness/2 and z=-thickness/2. The plane is split into cells along
+    every outline and footprint edge, each cell becomes a solid column,
+    and walls are emitted only where neighbouring columns differ, so the
+    result is watertight without any 3D boolean.
+
+    Returns (vertices, faces).
+    """
+    if not isinstance(outline, Polygon):
+        raise ValueError("outline must be a single polygon.")
+
+    z_bottom = -thickness / 2.0
+    z_top = thickness / 2.0
+    top_region = _footprint(top, outline)
+    bottom_region = _footprint(bottom, outline)
+
+    # Node every boundary against the others, then split the plane into
+    # cells that are each entirely inside or outside every footprint.
+    linework = [outline.exterior]
+    for region in (top_region, bottom_region):
+        if region is not None:
+            linework.append(region.boundary)
+    cells = [orient(cell, sign=1.0) for cell in polygonize(unary_union(linework))]
+
+    columns = []
+    for cell in cells:
+        point = cell.representative_point()
+        low = z_bottom
+        high = z_top
+        if bottom_region is not None and bottom_region.contains(point):
+            low = z_bottom + depth
+        if top_region is not None and top_region.contains(point):
+            high = z_top - depth
+        columns.append((low, high))
+
+    levels = sorted({z for column in columns for z in column})
+    level_index = {z: i for i, z in enumerate(levels)}
+    n_levels = len(levels)
+
+    point_ids = {}
+
+    def point_id(coord):
+        coord = (float(coord[0]), float(coord[1]))
+        index = point_ids.get(coord)
+        if index is None:
+            index = point_ids[coord] = len(point_ids)
+        return index
+
+    # Directed edges of every solid cell; the cell is on the left of each.
+    edge_owner = {}
+    cell_edges = []
+    for index, (cell, (low, high)) in enumerate(zip(cells, columns)):
+        edges = []
+        if low < high:
+            for ring in [cell.exterior, *cell.interiors]:
+                ids = [point_id(coord) for coord in ring.coords[:-1]]
+                for start, end in zip(ids, ids[1:] + ids[:1]):
+                    edge_owner[(start, end)] = index
+                    edges.append((start, end))
+        cell_edges.append(edges)
+
+    faces = []
+    for index, (cell, (low, high)) in enumerate(zip(cells, columns)):
+        if low >= high:
+            # Pockets from both faces meet: the cell is a through-hole.
+            continue
+
+        # A constrained triangulation uses exactly the cell's own boundary
+        # points, so cap edges always meet the neighbouring caps and walls.
+        # (Earcut may bridge holes through collinear, zero-area triangles,
+        # which leaves T-junctions.)
+        corners = shapely.get_coordinates(
+            shapely.constrained_delaunay_triangles(cell)).reshape(-1, 4, 2)[:, :3]
+        edge_a = corners[:, 1] - corners[:, 0]
+        edge_b = corners[:, 2] - corners[:, 0]
+        clockwise = (edge_a[:, 0] * edge_b[:, 1] - edge_a[:, 1] * edge_b[:, 0]) < 0
+        triangles = np.array(
+            [point_id(coord) for coord in corners.reshape(-1, 2)], dtype=np.int64
+        ).reshape(-1, 3)
+        triangles[clockwise] = triangles[clockwise][:, ::-1]
+        faces.append(triangles * n_levels + level_index[high])
+        faces.append(triangles[:, ::-1] * n_levels + level_index[low])
+
+        # Side walls wherever the neighbouring column does not cover this
+        # one, split at every level so vertical edges always pair up.
+        low_index = level_index[low]
+        high_index = level_index[high]
+        for start, end in cell_edges[index]:
+            neighbour = edge_owner.get((end, start))
+            if neighbour is None:
+                covered_low, covered_high = n_levels, -1
+            else:
+                covered_low = level_index[columns[neighbour][0]]
+                covered_high = level_index[columns[neighbour][1]]
+            for level in range(low_index, high_index):
+                if covered_low <= level < covered_high:
+                    continue
+                faces.append(
+                    [
+                        [start * n_levels + level, end * n_levels + level, end * n_levels + level + 1],
+                        [start * n_levels + level, end * n_levels + level + 1, start * n_levels + level + 1],
+                    ]
+                )
+
+    points = np.array(list(point_ids), dtype=float)
+    vertices = np.column_stack(
+        [
+            np.repeat(points, n_levels, axis=0),
+            np.tile(levels, len(points)),
+        ]
+    )
+    faces = np.vstack(faces).astype(np.int64)
+
+    # Only keep vertices that are referenced by a face.
+    used, faces = np.unique(faces, return_inverse=True)
+    return vertices[used], faces.reshape(-1, 3)
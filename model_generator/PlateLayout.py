@@ -0,0 +1,60 @@
+import math
+
+
+def plate_grid(item_width, item_depth, bed_width, bed_depth, spacing):
+    """Largest grid of identical items that fits on the bed.
+
+    Items are kept spacing apart from each other (not from the bed edge).
+    Returns (columns, rows, rotated), where rotated means the items are
+    turned by 90 degrees, or None if not even one item fits.
+    """
+    best = None
+    for rotated in (False, True):
+        width, depth = (item_depth, item_width) if rotated else (item_width, item_depth)
+        if width > bed_width or depth > bed_depth:
+            continue
+        columns = int(math.floor((bed_width + spacing) / (width + spacing)))
+        rows = int(math.floor((bed_depth + spacing) / (depth + spacing)))
+        if best is None or columns * rows > best[0] * best[1]:
+            best = (columns, rows, rotated)
+    return best
+
+
+def layout_plates(count, item_width, item_depth, bed_width, bed_depth, spacing):
+    """Spreads count identical items over as few plates as possible.
+
+    Returns a list of plates, each a list of (index, x, y, rotated) with the
+    item center in bed coordinates (origin at the bed's front-left corner).
+    Each plate's grid is centered on the bed.
+    """
+    grid = plate_grid(item_width, item_depth, bed_width, bed_depth, spacing)
+    if grid is None:
+        raise ValueError(
+            f"A {item_width} x {item_depth} mm card does not fit on a "
+            f"{bed_width} x {bed_depth} mm bed."
+        )
+    columns, rows, rotated = grid
+    width, depth = (item_depth, item_width) if rotated else (item_width, item_depth)
+    per_plate = columns * rows
+
+    plates = []
+    for first in range(0, count, per_plate):
+        indices = range(first, min(first + per_plate, count))
+        used_columns = min(columns, len(indices))
+        used_rows = int(math.ceil(len(indices) / columns))
+        x0 = (bed_width - (used_columns * width + (used_columns - 1) * spacing)) / 2.0
+        y0 = (bed_depth - (used_rows * depth + (used_rows - 1) * spacing)) / 2.0
+        plate = []
+        for slot, index in enumerate(indices):
+            row, column = divmod(slot, columns)
+            plate.append(
+                (
+                    index,
+                    x0 + column * (width + spacing) + width / 2.0,
+                    # Fill from the back of the bed towards the front.
+                    y0 + (used_rows - 1 - row) * (depth + spacing) + depth / 2.0,
+                    rotated,
+                )
+            )
+        plates.append(plate)
+    return plates
@@ -1,6 +1,10 @@
+import functools
+
 import numpy as np
 import trimesh
 
+from Metrics import timed
+
 try:
     import qrcode
 except ModuleNotFoundError as exc:
@@ -9,6 +13,276 @@ except ModuleNotFoundError as exc:
     ) from exc
 
 
+# Distinct (url, error correction, border) matrices kept in memory. A card
+# encodes its URL for the cutout and the fill; an editing session re-uses it
+# on every render.
+QR_MATRIX_CACHE_SIZE = 64
+
+
+@functools.lru_cache(maxsize=QR_MATRIX_CACHE_SIZE)
+@timed("qr.matrix")
+def encode_qr_matrix(url, error_correction, border):
+    """The QR code of url as a read-only bool array, border modules included.
+
+    Memoized; copy the result before changing it.
+    """
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=error_correction,
+        box_size=1,
+        border=0,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    matrix = np.pad(np.array(qr.get_matrix(), dtype=bool), border)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def dark_module_count(url, border, error_correction=None):
+    """Dark modules of the QR code QRGenerator builds for url.
+
+    Shares the encode_qr_matrix memo, so estimating a card's cost before
+    building it does not encode the URL twice. Raises ValueError if url
+    does not fit in a QR code.
+    """
+    try:
+        matrix = encode_qr_matrix(
+            url, error_correction or qrcode.constants.ERROR_CORRECT_M, int(border))
+    except (qrcode.exceptions.DataOverflowError, ValueError) as exc:
+        # qrcode raises either, depending on how far past version 40 it is.
+        raise ValueError("URL is too long for a QR code.") from exc
+    return int(np.count_nonzero(matrix))
+
+
+def _merge_rectangles(dark):
+    """Greedily covers the dark modules with maximal rectangles.
+
+    Each rectangle is grown along its row first and then downwards for as
+    long as the whole span stays dark. Returns an (N, 4) int array of
+    (row0, col0, row1, col1) with exclusive ends.
+    """
+    free = np.array(dark, dtype=bool)
+    rows, cols = free.shape
+    rects = []
+    for row in range(rows):
+        line = free[row]
+        col = 0
+        while col < cols:
+            if not line[col]:
+                col += 1
+                continue
+            end = col + 1
+            while end < cols and line[end]:
+                end += 1
+            bottom = row + 1
+            while bottom < rows and free[bottom, col:end].all():
+                bottom += 1
+            free[row:bottom, col:end] = False
+            rects.append((row, col, bottom, end))
+            col = end
+    return np.array(rects, dtype=np.int64).reshape(-1, 4)
+
+
+def _boundary_runs(edge_type, breaks):
+    """Splits every grid line into runs of equally oriented boundary edges.
+
+    edge_type is (lines, edges) with +1/-1 for the side the solid is on and
+    0 for no boundary; breaks is (lines, edges + 1). Returns the line, first
+    point, last point and type of every run.
+    """
+    nonzero = edge_type != 0
+    cut = (edge_type[:, 1:] != edge_type[:, :-1]) | breaks[:, 1:-1]
+    start = nonzero.copy()
+    start[:, 1:] &= cut
+    end = nonzero.copy()
+    end[:, :-1] &= cut
+    line, first = np.nonzero(start)
+    _, last = np.nonzero(end)
+    return line, first, last + 1, edge_type[line, first]
+
+
+def _extrude_rectangles(dark, rects, min_x, max_y, module_size, z_min, height):
+    """Builds one watertight prism over the dark modules covered by rects.
+
+    Caps are triangulated per rectangle and walls are only emitted on the
+    outline, split at every rectangle corner, so no edge ends in a
+    T-junction. Modules that only touch diagonally get separate vertices at
+    the shared corner to keep every edge 2-manifold.
+    """
+    dark = np.asarray(dark, dtype=bool)
+    n_rows, n_cols = dark.shape
+    padded = np.pad(dark, 1)
+
+    # Horizontal grid lines: +1 where the solid is in the row below the
+    # line, -1 above. Vertical grid lines: +1 solid to the right, -1 left.
+    h_type = padded[1:, 1:-1].astype(np.int8) - padded[:-1, 1:-1]
+    v_type = padded[1:-1, 1:].astype(np.int8) - padded[1:-1, :-1]
+
+    nw = padded[:-1, :-1]
+    ne = padded[:-1, 1:]
+    sw = padded[1:, :-1]
+    se = padded[1:, 1:]
+    # Grid points where two modules only meet diagonally; the module south
+    # of the point gets the second copy of its vertices.
+    pinch_a = nw & se & ~ne & ~sw
+    pinch_b = ne & sw & ~nw & ~se
+
+    breaks = np.zeros((n_rows + 1, n_cols + 1), dtype=bool)
+    r0, c0, r1, c1 = rects.T
+    breaks[r0, c0] = breaks[r0, c1] = breaks[r1, c0] = breaks[r1, c1] = True
+    breaks[:, 1:-1] |= h_type[:, 1:] != h_type[:, :-1]
+    breaks[:, 0] |= h_type[:, 0] != 0
+    breaks[:, -1] |= h_type[:, -1] != 0
+    breaks[1:-1, :] |= v_type[1:, :] != v_type[:-1, :]
+    breaks[0, :] |= v_type[0, :] != 0
+    breaks[-1, :] |= v_type[-1, :] != 0
+
+    def key(level, copy, i, j):
+        return ((level * 2 + copy) * (n_rows + 1) + i) * (n_cols + 1) + j
+
+    wall_start = []
+    wall_end = []
+
+    line, a, b, kind = _boundary_runs(h_type, breaks)
+    below = kind > 0
+    # Walk the outline counter-clockwise seen from above (solid on the left).
+    wall_start.append(np.where(
+        below,
+        key(0, pinch_b[line, b], line, b),
+        key(0, 0, line, a),
+    ))
+    wall_end.append(np.where(
+        below,
+        key(0, pinch_a[line, a], line, a),
+        key(0, 0, line, b),
+    ))
+
+    line, a, b, kind = _boundary_runs(v_type.T, breaks.T)
+    right = kind > 0
+    wall_start.append(np.where(
+        right,
+        key(0, pinch_a[a, line], a, line),
+        key(0, 0, b, line),
+    ))
+    wall_end.append(np.where(
+        right,
+        key(0, 0, b, line),
+        key(0, pinch_b[a, line], a, line),
+    ))
+
+    wall_start = np.concatenate(wall_start)
+    wall_end = np.concatenate(wall_end)
+    top_offset = key(1, 0, 0, 0)
+    wall_faces = np.concatenate(
+        [
+            np.column_stack([wall_start, wall_end, wall_end + top_offset]),
+            np.column_stack([wall_start, wall_end + top_offset, wall_start + top_offset]),
+        ]
+    )
+
+    # Number of breakpoints strictly inside each rectangle edge.
+    row_count = np.zeros((n_rows + 1, n_cols + 2), dtype=np.int64)
+    row_count[:, 1:] = np.cumsum(breaks, axis=1)
+    col_count = np.zeros((n_rows + 2, n_cols + 1), dtype=np.int64)
+    col_count[1:, :] = np.cumsum(breaks, axis=0)
+    inner = (
+        row_count[r0, c1] - row_count[r0, c0 + 1]
+        + row_count[r1, c1] - row_count[r1, c0 + 1]
+        + col_count[r1, c0] - col_count[r0 + 1, c0]
+        + col_count[r1, c1] - col_count[r0 + 1, c1]
+    )
+
+    simple = inner == 0
+    bl = key(0, 0, r1[simple], c0[simple])
+    br = key(0, 0, r1[simple], c1[simple])
+    tr = key(0, pinch_b[r0[simple], c1[simple]], r0[simple], c1[simple])
+    tl = key(0, pinch_a[r0[simple], c0[simple]], r0[simple], c0[simple])
+    cap_faces = [
+        np.column_stack([bl, br, tr]) + top_offset,
+        np.column_stack([bl, tr, tl]) + top_offset,
+        np.column_stack([bl, tr, br]),
+        np.column_stack([bl, tl, tr]),
+    ]
+
+    # Rectangles with extra points on their outline are fanned around a
+    # center vertex, which is appended after the grid vertices.
+    rings = []
+    for row0, col0, row1, col1 in rects[~simple]:
+        ring = []
+        for j in range(col0, col1):
+            if breaks[row1, j]:
+                ring.append(key(0, 0, row1, j))
+        for i in range(row1, row0, -1):
+            if breaks[i, col1]:
+                ring.append(key(0, 0, i, col1))
+        for j in range(col1, col0, -1):
+            if breaks[row0, j]:
+                copy = pinch_b[row0, col1] if j == col1 else 0
+                ring.append(key(0, copy, row0, j))
+        for i in range(row0, row1):
+            if breaks[i, col0]:
+                copy = pinch_a[row0, col0] if i == row0 else 0
+                ring.append(key(0, copy, i, col0))
+        rings.append(ring)
+
+    ring_lengths = np.array([len(ring) for ring in rings], dtype=np.int64)
+    ring_keys = np.array(
+        [k for ring in rings for k in ring], dtype=np.int64)
+    ring_id = np.repeat(np.arange(len(rings)), ring_lengths)
+    # Index of the following point on the same ring, wrapping around.
+    following = np.arange(len(ring_keys)) + 1
+    ring_end = np.cumsum(ring_lengths)
+    following[ring_end - 1] = ring_end - ring_lengths
+
+    keys, inverse = np.unique(
+        np.concatenate(
+            [wall_faces.ravel()]
+            + [faces.ravel() for faces in cap_faces]
+            + [ring_keys, ring_keys + top_offset]
+        ),
+        return_inverse=True,
+    )
+    j = keys % (n_cols + 1)
+    i = (keys // (n_cols + 1)) % (n_rows + 1)
+    level = keys // top_offset
+    grid_vertices = np.column_stack(
+        [
+            min_x + j * module_size,
+            max_y - i * module_size,
+            z_min + level * height,
+        ]
+    )
+
+    n_flat = wall_faces.size + sum(faces.size for faces in cap_faces)
+    flat_faces = inverse[:n_flat].reshape(-1, 3)
+
+    ring_bottom = inverse[n_flat:n_flat + len(ring_keys)]
+    ring_top = inverse[n_flat + len(ring_keys):]
+
+    row0, col0, row1, col1 = rects[~simple].T
+    center_x = min_x + (col0 + col1) / 2.0 * module_size
+    center_y = max_y - (row0 + row1) / 2.0 * module_size
+    center_vertices = np.column_stack(
+        [
+            np.repeat(center_x, 2),
+            np.repeat(center_y, 2),
+            np.tile([z_min, z_min + height], len(rings)),
+        ]
+    )
+    center_bottom = len(grid_vertices) + 2 * ring_id
+    center_top = center_bottom + 1
+
+    fan_faces = [
+        np.column_stack([center_top, ring_top, ring_top[following]]),
+        np.column_stack([center_bottom, ring_bottom[following], ring_bottom]),
+    ]
+    return (
+        np.vstack([grid_vertices, center_vertices]),
+        np.vstack([flat_faces] + fan_faces),
+    )
+
+
 class QRGenerator:
     def __init__(
         self,
@@ -33,7 +307,9 @@ class QRGenerator:
     def qr_matrix(self, url, border=None):
         return self._qr_matrix(url, border=border)
 
-    def iter_module_boxes(self, x, y, url, module_size=None, border=None, side="top"):
+    def module_boxes(self, x, y, url, module_size=None, border=None, side="top"):
+        """(N, 4) array of (x_min, y_min, z_min, module_size), one row per
+        dark module, in row-major order."""
         if module_size is None:
             module_size = self.module_size
         if module_size <= 0:
@@ -52,44 +328,112 @@ class QRGenerator:
         else:
             z_min = -top_z
 
-        for row in range(size):
-            for col in range(size):
-                if not matrix[row][col]:
-                    continue
-                yield (
-                    min_x + (col * module_size),
-                    max_y - ((row + 1.0) * module_size),
-                    z_min,
-                    module_size,
-                )
+        rows, cols = np.nonzero(matrix)
+        return np.column_stack(
+            [
+                min_x + (cols * module_size),
+                max_y - ((rows + 1.0) * module_size),
+                np.full(len(rows), z_min),
+                np.full(len(rows), module_size),
+            ]
+        )
+
+    def iter_module_boxes(self, x, y, url, module_size=None, border=None, side="top"):
+        """Yields the rows of module_boxes as (x_min, y_min, z_min, module_size) tuples."""
+        boxes = self.module_boxes(x, y, url, module_size=module_size, border=border, side=side)
+        yield from map(tuple, boxes.tolist())
+
+    def iter_module_rects(
+        self, x, y, url, module_size=None, border=None, side="top", margin=0.0
+    ):
+        """Like iter_module_boxes, with adjacent dark modules merged into rectangles.
+
+        Yields (x_min, y_min, z_min, width, height) tuples. On the bottom
+        side z_min is margin below the face, so that a cutter margin taller
+        than depth sticks out of the face and still cuts depth deep.
+        """
+        if module_size is None:
+            module_size = self.module_size
+        if module_size <= 0:
+            raise ValueError("module_size must be positive.")
+        if side not in {"top", "bottom"}:
+            raise ValueError("side must be 'top' or 'bottom'.")
+
+        matrix = self._qr_matrix(url, border=border)
+        size = len(matrix)
+        total_size = size * module_size
+        min_x = x - (total_size / 2.0)
+        max_y = y + (total_size / 2.0)
+        top_z = self.box_extents[2] / 2.0
+        if side == "top":
+            z_min = top_z - self.depth
+        else:
+            z_min = -top_z - margin
+
+        for row0, col0, row1, col1 in _merge_rectangles(matrix):
+            yield (
+                min_x + (col0 * module_size),
+                max_y - (row1 * module_size),
+                z_min,
+                (col1 - col0) * module_size,
+                (row1 - row0) * module_size,
+            )
+
+    @timed("qr.cutout_mesh")
+    def build_cutout_mesh(self, x, y, url, height, module_size=None, border=None, side="top"):
+        """Builds the QR cutout as one watertight mesh of the given height, without OpenSCAD.
+
+        Whatever height exceeds depth sticks out of the card face, so the
+        pocket is depth deep on either side.
+        """
+        if module_size is None:
+            module_size = self.module_size
+        if module_size <= 0:
+            raise ValueError("module_size must be positive.")
+        if side not in {"top", "bottom"}:
+            raise ValueError("side must be 'top' or 'bottom'.")
+
+        dark = self._qr_matrix(url, border=border)
+        rects = _merge_rectangles(dark)
+        if not len(rects):
+            raise ValueError("QR matrix has no filled modules.")
+
+        size = len(dark)
+        total_size = size * module_size
+        min_x = x - (total_size / 2.0)
+        max_y = y + (total_size / 2.0)
+        top_z = self.box_extents[2] / 2.0
+        if side == "top":
+            z_min = top_z - self.depth
+        else:
+            z_min = -top_z - (height - self.depth)
+
+        vertices, faces = _extrude_rectangles(
+            dark, rects, min_x, max_y, module_size, z_min, height)
+        return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
 
     def _qr_matrix(self, url, border=None):
         if border is None:
             border = self.border
-        qr = qrcode.QRCode(
-            version=None,
-            error_correction=self.error_correction,
-            box_size=1,
-            border=0,
-        )
-        qr.add_data(url)
-        qr.make(fit=True)
-        matrix = qr.get_matrix()
-        if not border:
-            return matrix
+        return encode_qr_matrix(url, self.error_correction, int(border))
 
-        size = len(matrix)
-        padded_size = size + (2 * border)
-        padding_row = [False] * padded_size
-        padded = [padding_row[:] for _ in range(border)]
-        for row in matrix:
-            padded.append(
-                ([False] * border) + list(row) + ([False] * border)
-            )
-        padded.extend([padding_row[:] for _ in range(border)])
-        return padded
+    @timed("qr.fill_mesh")
+    def build_qr_mesh(
+        self,
+        x,
+        y,
+        url,
+        module_size=None,
+        border=None,
+        side="top",
+        drop_internal_faces=False,
+    ):
+        """Builds one mesh of module-sized boxes for every dark QR module.
 
-    def build_qr_mesh(self, x, y, url, module_size=None, border=None, side="top"):
+        All boxes are generated in a single NumPy broadcast. With
+        drop_internal_faces=True the faces shared by adjacent modules are
+        left out and the result is one watertight solid of the same shape.
+        """
         if module_size is None:
             module_size = self.module_size
         if module_size <= 0:
@@ -97,8 +441,8 @@ class QRGenerator:
         if side not in {"top", "bottom"}:
             raise ValueError("side must be 'top' or 'bottom'.")
 
-        matrix = self._qr_matrix(url, border=border)
-        size = len(matrix)
+        dark = self._qr_matrix(url, border=border)
+        size = len(dark)
         total_size = size * module_size
         top_z = self.box_extents[2] / 2.0
         min_x = x - (total_size / 2.0)
@@ -108,31 +452,38 @@ class QRGenerator:
         else:
             z_center = -top_z + (self.depth / 2.0)
 
-        box_extents = np.array([module_size, module_size, self.depth], dtype=float)
-        meshes = []
-
-        for row in range(size):
-            for col in range(size):
-                if not matrix[row][col]:
-                    continue
-                center = np.array(
-                    [
-                        min_x + ((col + 0.5) * module_size),
-                        max_y - ((row + 0.5) * module_size),
-                        z_center,
-                    ],
-                    dtype=float,
-                )
-                module = trimesh.creation.box(extents=box_extents)
-                module.apply_translation(center)
-                meshes.append(module)
-
-        if not meshes:
+        rows, cols = np.nonzero(dark)
+        if not len(rows):
             raise ValueError("QR matrix has no filled modules.")
 
-        if len(meshes) == 1:
-            qr_mesh = meshes[0]
-        else:
-            qr_mesh = trimesh.util.concatenate(meshes)
-        qr_mesh.split()
-        return qr_mesh
+        if drop_internal_faces:
+            vertices, faces = _extrude_rectangles(
+                dark,
+                _merge_rectangles(dark),
+                min_x,
+                max_y,
+                module_size,
+                z_center - (self.depth / 2.0),
+                self.depth,
+            )
+            return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+
+        box_extents = np.array([module_size, module_size, self.depth], dtype=float)
+        module = trimesh.creation.box(extents=box_extents)
+        centers = np.column_stack(
+            [
+                min_x + ((cols + 0.5) * module_size),
+                max_y - ((rows + 0.5) * module_size),
+                np.full(len(rows), z_center),
+            ]
+        )
+        vertices = module.vertices[np.newaxis, :, :] + centers[:, np.newaxis, :]
+        faces = (
+            module.faces[np.newaxis, :, :]
+            + (np.arange(len(rows)) * len(module.vertices))[:, np.newaxis, np.newaxis]
+        )
+        return trimesh.Trimesh(
+            vertices=vertices.reshape(-1, 3),
+            faces=faces.reshape(-1, 3),
+            process=False,
+        )
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+# A temp file whose writer is still alive is only removed once it is this
+# old (seconds), in case the pid was reused or the writer hung.
+STALE_TMP_SECONDS = 3600
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _stale_tmp(path, now):
+    """Whether path is a temp file left over from a write that never completed.
+
+    Temp files are named <pid>-<random>.tmp after the process writing them.
+    """
+    pid = path.name.partition("-")[0]
+    try:
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            return True
+        return now - path.stat().st_mtime > STALE_TMP_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+class ResultCache:
+    """Bounded LRU cache of finished files on local disk, evicted by total size.
+
+    Entries are stored as <key><suffix> in directory. Recency survives
+    restarts through the files' modification times, and entries are
+    committed atomically, so a crash or an aborted write never leaves a
+    partial file behind. Several processes may share the directory and its
+    budget: every commit rebuilds the index from the directory before
+    evicting, and only the temp files of dead or hung writers are cleaned up.
+    """
+
+    def __init__(self, directory, max_bytes, suffix=""):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_bytes)
+        self.suffix = suffix
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._scan()
+            self._evict()
+
+    def _path(self, key):
+        return self.directory / f"{key}{self.suffix}"
+
+    def _scan(self):
+        """Rebuilds the index from the directory, least recently used first,
+        so entries written by other processes count against the budget."""
+        existing = []
+        now = time.time()
+        for path in self.directory.iterdir():
+            try:
+                if path.name.endswith(".tmp"):
+                    if _stale_tmp(path, now):
+                        path.unlink(missing_ok=True)
+                elif path.name.endswith(self.suffix) and path.is_file():
+                    stat = path.stat()
+                    existing.append((stat.st_mtime, path.name, stat.st_size))
+            except FileNotFoundError:
+                # Evicted by another process meanwhile.
+                continue
+        self._entries.clear()
+        self.current_bytes = 0
+        for _, name, size in sorted(existing):
+            key = name[:len(name) - len(self.suffix)] if self.suffix else name
+            self._entries[key] = size
+            self.current_bytes += size
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._path(key).unlink(missing_ok=True)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def get(self, key):
+        """Returns the cached bytes, or None on a miss.
+
+        Reads the file whether or not this process wrote it: the index only
+        orders eviction. Blocking, so call it off the event loop.
+        """
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            # Never written, or evicted by another process; forget it.
+            with self._lock:
+                self.misses += 1
+                self._forget(key)
+            return None
+        with self._lock:
+            self.hits += 1
+            self._forget(key)
+            self._entries[key] = len(data)
+            self.current_bytes += len(data)
+        return data
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self.current_bytes -= size
+
+    @contextmanager
+    def writer(self, key):
+        """Context manager yielding a binary file to fill with the entry for key.
+
+        The entry is committed when the block exits normally and discarded
+        if it raises (including GeneratorExit from an abandoned stream).
+        """
+        handle, tmp_name = tempfile.mkstemp(
+            dir=self.directory, prefix=f"{os.getpid()}-", suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as tmp:
+                yield tmp
+                size = tmp.tell()
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+        if size > self.max_bytes:
+            os.unlink(tmp_name)
+            return
+        os.replace(tmp_name, self._path(key))
+        with self._lock:
+            self._scan()
+            self._evict()
+
+    def put(self, key, data):
+        with self.writer(key) as tmp:
+            tmp.write(data)
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                self._path(key).unlink(missing_ok=True)
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,87 @@
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+def _no_progress(name, state):
+    pass
+
+
+class TaskGraph:
+    """A small dependency graph of blocking tasks.
+
+    Each task is called with the results of its dependencies, in the order
+    they were given, once they are all done. Dependencies must be added
+    before the tasks that use them, so the graph cannot have cycles.
+
+        graph = TaskGraph()
+        graph.add("base", build_base)
+        graph.add("text", build_text)
+        graph.add("body", subtract, deps=["base", "text"])
+        results = graph.run(executor)
+    """
+
+    def __init__(self):
+        # name -> (fn, deps), in insertion (and so topological) order.
+        self._tasks = {}
+
+    def add(self, name, fn, deps=()):
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task {name!r}.")
+        for dep in deps:
+            if dep not in self._tasks:
+                raise ValueError(f"Task {name!r} depends on unknown task {dep!r}.")
+        self._tasks[name] = (fn, tuple(deps))
+        return name
+
+    def run(self, executor=None, progress=_no_progress):
+        """Runs every task and returns {name: result}.
+
+        With an executor, each task is submitted as soon as its
+        dependencies are done, so independent tasks run in parallel (as
+        far as the executor's workers allow); without one, tasks run one
+        after another in the order they were added. The tasks see the
+        caller's context variables.
+
+        progress(name, state) is called from the calling thread with
+        "running" when a task starts and "done" when it succeeds. If a task
+        fails, no further task is started and its exception is raised once
+        the running ones have finished.
+        """
+        results = {}
+        if executor is None:
+            for name, (fn, deps) in self._tasks.items():
+                progress(name, "running")
+                results[name] = fn(*(results[dep] for dep in deps))
+                progress(name, "done")
+            return results
+
+        waiting = dict(self._tasks)
+        running = {}
+        error = None
+        while waiting or running:
+            if error is None:
+                for name, (fn, deps) in list(waiting.items()):
+                    if all(dep in results for dep in deps):
+                        del waiting[name]
+                        progress(name, "running")
+                        future = executor.submit(
+                            contextvars.copy_context().run,
+                            fn,
+                            *(results[dep] for dep in deps),
+                        )
+                        running[future] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except BaseException as exc:
+                    if error is None:
+                        error = exc
+                    continue
+                progress(name, "done")
+        if error is not None:
+            raise error
+        return results
@@ -0,0 +1,218 @@
+import functools
+import math
+import threading
+
+import numpy as np
+import trimesh
+
+try:
+    from fontTools.pens.basePen import BasePen
+    from fontTools.ttLib import TTFont
+except ModuleNotFoundError as exc:
+    raise RuntimeError(
+        "Missing dependency: fonttools. Install with `pip install fonttools`."
+    ) from exc
+
+try:
+    from shapely.affinity import affine_transform
+    from shapely.geometry import Polygon
+    from shapely.ops import polygonize, unary_union
+except ModuleNotFoundError as exc:
+    raise RuntimeError(
+        "Missing dependency: shapely. Install with `pip install shapely`."
+    ) from exc
+
+
+# OpenSCAD renders text at 100 dpi, so a size of 25.4 is a 100 pt font:
+# one em is size / 0.72 millimeters.
+EM_PER_SIZE = 1.0 / 0.72
+
+
+def _curve_steps(size, fa=12.0, fs=2.0):
+    """Line segments per curve, as OpenSCAD's text() derives them from $fa/$fs."""
+    fragments = math.ceil(max(min(360.0 / fa, size * 2.0 * math.pi / fs), 5.0))
+    return max(int(math.floor(fragments / 8.0 + 1.0)), 2)
+
+
+class _OutlinePen(BasePen):
+    """Collects glyph contours as point lists, flattening curves."""
+
+    def __init__(self, glyph_set, steps):
+        super().__init__(glyph_set)
+        self.steps = steps
+        self.rings = []
+        self._ring = []
+
+    def _moveTo(self, pt):
+        self._ring = [pt]
+
+    def _lineTo(self, pt):
+        self._ring.append(pt)
+
+    def _curveToOne(self, pt1, pt2, pt3):
+        p0 = np.array(self._getCurrentPoint(), dtype=float)
+        t = np.linspace(0.0, 1.0, self.steps + 1)[1:, np.newaxis]
+        points = (
+            ((1 - t) ** 3) * p0
+            + 3 * ((1 - t) ** 2) * t * np.array(pt1, dtype=float)
+            + 3 * (1 - t) * (t ** 2) * np.array(pt2, dtype=float)
+            + (t ** 3) * np.array(pt3, dtype=float)
+        )
+        self._ring.extend(map(tuple, points))
+
+    def _qCurveToOne(self, pt1, pt2):
+        p0 = np.array(self._getCurrentPoint(), dtype=float)
+        t = np.linspace(0.0, 1.0, self.steps + 1)[1:, np.newaxis]
+        points = (
+            ((1 - t) ** 2) * p0
+            + 2 * (1 - t) * t * np.array(pt1, dtype=float)
+            + (t ** 2) * np.array(pt2, dtype=float)
+        )
+        self._ring.extend(map(tuple, points))
+
+    def _closePath(self):
+        ring = self._ring
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring = ring[:-1]
+        if len(ring) >= 3:
+            self.rings.append(ring)
+        self._ring = []
+
+    _endPath = _closePath
+
+
+def _fill_nonzero(rings):
+    """Region covered by the contours under TrueType's nonzero winding rule."""
+    contours = [Polygon(ring) for ring in rings]
+    contours = [contour for contour in contours if contour.area > 0]
+    if not contours:
+        return None
+
+    # Split the plane into faces along every contour, then keep the faces
+    # with a nonzero winding number.
+    faces = polygonize(unary_union([contour.exterior for contour in contours]))
+    filled = []
+    for face in faces:
+        point = face.representative_point()
+        winding = sum(
+            -1 if contour.exterior.is_ccw else 1
+            for contour in contours
+            if contour.contains(point)
+        )
+        if winding:
+            filled.append(face)
+    if not filled:
+        return None
+    return unary_union(filled)
+
+
+class TextEngine:
+    """Renders text like OpenSCAD's text() + linear_extrude, without a subprocess.
+
+    Glyph outlines are read from the TTF once, tessellated into a unit-height
+    extrusion in font units and cached; strings are laid out with the
+    font's advance widths, halign="left" and valign="center".
+    """
+
+    def __init__(self, font_path):
+        self.font_path = font_path
+        font = TTFont(font_path)
+        self.units_per_em = font["head"].unitsPerEm
+        self.cmap = font.getBestCmap()
+        self.advances = {
+            name: advance for name, (advance, _) in font["hmtx"].metrics.items()
+        }
+        self.glyph_set = font.getGlyphSet()
+        self._glyphs = {}
+        self._lock = threading.Lock()
+
+    def _glyph_name(self, char):
+        return self.cmap.get(ord(char), ".notdef")
+
+    def glyph(self, name, steps):
+        """Outline and unit-height extrusion of a glyph in font units, or None if blank."""
+        key = (name, steps)
+        pen = _OutlinePen(self.glyph_set, steps)
+        with self._lock:
+            if key in self._glyphs:
+                return self._glyphs[key]
+            # fontTools expands glyphs on first access, which is not
+            # thread-safe; the tessellation below is.
+            self.glyph_set[name].draw(pen)
+        outline = _fill_nonzero(pen.rings)
+        glyph = None
+        if outline is not None:
+            polygons = getattr(outline, "geoms", [outline])
+            extrusion = trimesh.util.concatenate(
+                [trimesh.creation.extrude_polygon(polygon, 1.0) for polygon in polygons]
+            )
+            glyph = (
+                outline,
+                np.asarray(extrusion.vertices, dtype=float),
+                np.asarray(extrusion.faces, dtype=np.int64),
+            )
+
+        with self._lock:
+            self._glyphs[key] = glyph
+        return glyph
+
+    def layout(self, text, size):
+        """Places every visible glyph of text.
+
+        Returns (scale, placements), where scale converts font units to mm and
+        placements is a list of (glyph, x, y) with the offsets in mm.
+        """
+        scale = size * EM_PER_SIZE / self.units_per_em
+        steps = _curve_steps(size)
+
+        glyphs = []
+        pen_x = 0.0
+        ascend = 0.0
+        descend = 0.0
+        for char in text:
+            name = self._glyph_name(char)
+            glyph = self.glyph(name, steps)
+            if glyph is not None:
+                _, min_y, _, max_y = glyph[0].bounds
+                ascend = max(ascend, max_y)
+                descend = max(descend, -min_y)
+                glyphs.append((glyph, pen_x))
+            pen_x += self.advances.get(name, 0)
+
+        # valign="center" centers the ink between the highest ascender and
+        # the lowest descender of the string.
+        y_offset = (descend - ascend) / 2.0 * scale
+        return scale, [(glyph, x * scale, y_offset) for glyph, x in glyphs]
+
+    def text_outline(self, text, size):
+        """2D footprint of text as a shapely geometry, with its anchor at the origin."""
+        scale, placements = self.layout(text, size)
+        return unary_union(
+            [
+                affine_transform(outline, [scale, 0.0, 0.0, scale, x, y])
+                for (outline, _, _), x, y in placements
+            ]
+        )
+
+    def text_mesh(self, text, size, height):
+        """Text extruded from z=0 to z=height, with its anchor at the origin."""
+        scale, placements = self.layout(text, size)
+        if not placements:
+            return trimesh.Trimesh()
+
+        vertices = []
+        faces = []
+        offset = 0
+        for (_, glyph_vertices, glyph_faces), x, y in placements:
+            vertices.append(glyph_vertices * [scale, scale, height] + [x, y, 0.0])
+            faces.append(glyph_faces + offset)
+            offset += len(glyph_vertices)
+
+        return trimesh.Trimesh(
+            vertices=np.vstack(vertices), faces=np.vstack(faces), process=False)
+
+
+@functools.lru_cache(maxsize=8)
+def get_text_engine(font_path):
+    """Shared engine per font file, so glyphs are tessellated once per process."""
+    return TextEngine(font_path)
@@ -0,0 +1,164 @@
+import os
+import zipfile
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+# zlib level for the 3MF entries, 0 (stored) to 9. The model XML is very
+# repetitive, so level 1 already gets most of the size reduction.
+THREEMF_COMPRESSION_LEVEL = int(os.environ.get("CARD_3MF_COMPRESSION_LEVEL", 5))
+
+# Vertices and triangles formatted per batch; bounds the size of each
+# formatted string and so the writer's peak memory.
+THREEMF_BATCH_SIZE = 8192
+
+CORE_NAMESPACE = "http://schemas.microsoft.com/3dmanufacturing/core/2015/02"
+
+RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+    'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+    "</Relationships>"
+)
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="model" '
+    'ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+    "</Types>"
+)
+
+# Seven significant digits keep sub-micron precision across a card.
+VERTEX_TEMPLATE = '<vertex x="%.7g" y="%.7g" z="%.7g"/>'
+TRIANGLE_TEMPLATE = '<triangle v1="%d" v2="%d" v3="%d"/>'
+
+
+class ChunkSink:
+    """Write-only, unseekable file object that hands written bytes back in chunks.
+
+    zipfile falls back to data descriptors when it cannot seek, so every
+    entry is written once, front to back.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _format_rows(template, rows, batch_size):
+    """Yields rows formatted with template, batch_size rows per string.
+
+    The template is repeated once per row and filled in with a single %
+    operation over the flattened batch, instead of formatting per value.
+    """
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        yield ((template * len(batch)) % tuple(batch.ravel().tolist())).encode("ascii")
+
+
+def _transform_attribute(matrix):
+    matrix = np.asarray(matrix, dtype=float)
+    if np.allclose(matrix, np.eye(4)):
+        return ""
+    # 3MF stores the 3x4 affine part column by column.
+    values = " ".join("%.9g" % value for value in matrix[:3, :4].T.ravel())
+    return " transform=%s" % quoteattr(values)
+
+
+def _model_parts(scene, batch_size):
+    """Yields the 3D/3dmodel.model document of scene as byte strings."""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<model unit="millimeter" xml:lang="en-US" xmlns="%s"><resources>' % CORE_NAMESPACE
+    ).encode("ascii")
+
+    object_ids = {}
+    for name, mesh in scene.geometry.items():
+        if len(mesh.faces) == 0:
+            continue
+        object_ids[name] = len(object_ids) + 1
+        yield (
+            '<object id="%d" name=%s type="model"><mesh><vertices>'
+            % (object_ids[name], quoteattr(str(name)))
+        ).encode("utf-8")
+        yield from _format_rows(
+            VERTEX_TEMPLATE, np.asarray(mesh.vertices, dtype=float), batch_size)
+        yield b"</vertices><triangles>"
+        yield from _format_rows(
+            TRIANGLE_TEMPLATE, np.asarray(mesh.faces, dtype=np.int64), batch_size)
+        yield b"</triangles></mesh></object>"
+
+    items = []
+    for node in scene.graph.nodes_geometry:
+        matrix, geometry_name = scene.graph[node]
+        if geometry_name not in object_ids:
+            continue
+        items.append(
+            '<item objectid="%d" partnumber=%s%s/>'
+            % (object_ids[geometry_name], quoteattr(str(node)), _transform_attribute(matrix))
+        )
+    yield ("</resources><build>%s</build></model>" % "".join(items)).encode("utf-8")
+
+
+def iter_3mf(scene, compresslevel=None, batch_size=THREEMF_BATCH_SIZE):
+    """Serializes a trimesh.Scene as a 3MF package, yielding it in chunks.
+
+    Nothing is written to disk and only one batch of formatted XML is held
+    at a time, so the output can go straight into a streaming response.
+    compresslevel defaults to THREEMF_COMPRESSION_LEVEL; 0 stores the
+    entries uncompressed.
+    """
+    if compresslevel is None:
+        compresslevel = THREEMF_COMPRESSION_LEVEL
+    if not 0 <= compresslevel <= 9:
+        raise ValueError("compresslevel must be between 0 and 9.")
+    if compresslevel == 0:
+        zip_kwargs = {"compression": zipfile.ZIP_STORED}
+    else:
+        zip_kwargs = {"compression": zipfile.ZIP_DEFLATED, "compresslevel": compresslevel}
+
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", **zip_kwargs) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES_XML)
+        archive.writestr("_rels/.rels", RELS_XML)
+        with archive.open("3D/3dmodel.model", mode="w") as entry:
+            for part in _model_parts(scene, batch_size):
+                entry.write(part)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+    yield sink.drain()
+
+
+def export_3mf(scene, compresslevel=None):
+    """Serializes a trimesh.Scene as 3MF and returns the bytes."""
+    return b"".join(iter_3mf(scene, compresslevel=compresslevel))
+
+
+def iter_zip(entries):
+    """Streams a zip archive of (name, data) entries, yielding it in chunks.
+
+    Entries are stored uncompressed: they are meant for files that are
+    already compressed, such as 3MF packages.
+    """
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from Metrics import timed
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class WarmUp:
+    """Runs named warm-up steps in order, on a background thread.
+
+    A failing step is logged and recorded, and the next steps still run.
+    The service is ready once every step has finished, unless one of the
+    required steps failed: those check that it can serve at all. A failed
+    optional step (cache priming) only marks it degraded, so a broken
+    warm-up alone cannot keep it out of rotation.
+    """
+
+    def __init__(self, steps, required=()):
+        self._steps = list(steps)
+        self.required = set(required)
+        self.stages = OrderedDict((name, PENDING) for name, _ in self._steps)
+        self.errors = {}
+        self.seconds = {}
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Starts the steps unless they already started."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.started = time.time()
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+        self._thread.start()
+
+    def skip(self):
+        """Marks the warm-up as finished without running any step."""
+        with self._lock:
+            self.started = self.finished = time.time()
+
+    def _run(self):
+        for name, step in self._steps:
+            with self._lock:
+                self.stages[name] = RUNNING
+            start = time.perf_counter()
+            error = None
+            try:
+                with timed(f"warmup.{name}"):
+                    step()
+            except Exception as exc:
+                logger.warning("Warm-up step %s failed: %s", name, exc)
+                error = f"{type(exc).__name__}: {exc}"
+            with self._lock:
+                self.stages[name] = FAILED if error else DONE
+                self.seconds[name] = time.perf_counter() - start
+                if error:
+                    self.errors[name] = error
+        with self._lock:
+            self.finished = time.time()
+        logger.info("Warm-up finished in %.2fs", self.finished - self.started)
+
+    @property
+    def ready(self):
+        return self.finished is not None and not self.required.intersection(self.errors)
+
+    @property
+    def degraded(self):
+        """Whether an optional step failed."""
+        return bool(set(self.errors) - self.required)
+
+    def wait(self, timeout=None):
+        """Blocks until the warm-up finished; returns whether it did."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.finished is not None
+
+    def status(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "degraded": self.degraded,
+                "stages": [
+                    {
+                        "name": name,
+                        "state": state,
+                        "required": name in self.required,
+                        "seconds": self.seconds.get(name),
+                        "error": self.errors.get(name),
+                    }
+                    for name, state in self.stages.items()
+                ],
+                "started": self.started,
+                "finished": self.finished,
+            }
@@ -0,0 +1,827 @@
+"""Micro-benchmarks for QRGenerator and Carver.
+
+Runs every case of a parameter grid (URL length, QR error correction, text
+length, card size) in its own worker process and records wall time, peak
+RSS and triangle count:
+
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json --output new.json
+
+With --baseline, median times are compared case by case, and the exit
+status is 1 if any case got slower than --threshold.
+
+    python benchmark.py --check-volumes
+
+instead checks that the planar carve and the 3D boolean build the same
+body, with the QR code on either face, that the native QR cutout matches
+one box per dark module, that the native text engine
+matches OpenSCAD's text() when OpenSCAD is installed and renders the
+same meshes from several threads at once, that OpenSCAD booleans come
+back right in every exchange mode (pipes, result format, workspace), and
+
+    python benchmark.py --check-startup
+
+that importing the server and scraping /metrics leaves the geometry
+stack unloaded, and
+
+    python benchmark.py --check-admission
+
+that the admission controller orders, ages, cancels and shares slots
+between clients as documented.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import qrcode
+
+import OpenSCADRunner
+from Admission import AdmissionController, AdmissionRejected
+from BooleanBackend import OpenSCADBackend
+from Carver import Carver, _rounded_slab, text_mesh_cache
+from OpenSCADRunner import openscad_version, render_scad
+from QRGenerator import encode_qr_matrix
+
+FONT = "Monocraft"
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts/Monocraft-Bold.ttf")
+DEPTH = 0.4
+QR_MODULE_SIZE = 1.35
+QR_BORDER = 2
+
+URL_LENGTHS = (20, 100, 300, 1000)
+ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+TEXT_LENGTHS = (5, 20, 40)
+CARD_SIZES = ((85.0, 54.0, 1.6), (100.0, 70.0, 3.0))
+TEXT_ENGINES = ("native", "openscad")
+# Largest body volume difference (mm^3) allowed between the planar carve
+# and the 3D boolean; the outlines are polygonized slightly differently.
+VOLUME_TOLERANCE = 1.0
+# Strings and sizes the native text engine is compared with OpenSCAD text()
+# on: holes, descenders, digits and punctuation.
+TEXT_SAMPLES = ("Ada Lovelace", "gjpqy Engineer", "ada@example.com", "+1 (555) 010-0199")
+TEXT_SAMPLE_SIZES = (4.5, 3.1)
+# Largest relative area difference, and bounding box difference (mm),
+# allowed between the two engines' glyphs. Curves are flattened into a
+# similar but not identical number of segments. Provisional: not yet
+# calibrated against a real OpenSCAD; set them from the largest
+# differences _check_text_engine prints.
+TEXT_AREA_TOLERANCE = 0.02
+TEXT_BOUNDS_TOLERANCE = 0.1
+# Threads rendering the text samples at once on a cold TextEngine, and how
+# many cold engines are tried (glyphs only race on their first draw).
+TEXT_THREADS = 8
+TEXT_THREAD_ENGINES = 20
+
+
+def _url(length):
+    base = "https://example.com/"
+    return (base + "p" * length)[:max(length, len(base))]
+
+
+def _text(length):
+    return ("Jane Example, Senior Engineer " * 4)[:length]
+
+
+def _text_fields(text_length):
+    """Four fields like a typical card, each text_length characters long."""
+    text = _text(text_length)
+    return [(-38.0, 18.0, text, 4.5), (-38.0, 10.0, text, 3.1),
+            (-38.0, 2.0, text, 3.1), (-38.0, -6.0, text, 3.1)]
+
+
+def _triangles(result):
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return sum(_triangles(item) for item in result)
+    faces = getattr(result, "faces", None)
+    return 0 if faces is None else len(faces)
+
+
+def _carver(card, engine="native", ec="M"):
+    return Carver(
+        np.array(card),
+        FONT,
+        DEPTH,
+        qr_module_size=QR_MODULE_SIZE,
+        qr_border=QR_BORDER,
+        qr_error_correction=ERROR_CORRECTION[ec],
+        font_path=FONT_PATH,
+        text_engine=engine,
+    )
+
+
+def _needs(engine=None, openscad=False, planar=False):
+    """Reason a case cannot run here, or None."""
+    if (openscad or engine == "openscad") and openscad_version() is None:
+        return "OpenSCAD not available"
+    if engine == "native" or planar:
+        try:
+            import TextEngine  # noqa: F401
+        except RuntimeError as exc:
+            return str(exc)
+    return None
+
+
+def _qr_cases():
+    for length in URL_LENGTHS:
+        for ec in ERROR_CORRECTION:
+            params = {"url_length": length, "ec": ec}
+            url = _url(length)
+
+            def setup(ec=ec):
+                return _carver(CARD_SIZES[0], ec=ec).qr_generator
+
+            yield "qr._qr_matrix", params, setup, lambda qr, url=url: qr._qr_matrix(url), None
+            yield (
+                "qr.iter_module_boxes", params, setup,
+                lambda qr, url=url: list(qr.iter_module_boxes(0.0, 0.0, url)), None,
+            )
+            yield (
+                "qr.module_boxes", params, setup,
+                lambda qr, url=url: qr.module_boxes(0.0, 0.0, url), None,
+            )
+            for drop in (False, True):
+                yield (
+                    "qr.build_qr_mesh", {**params, "drop_internal_faces": drop}, setup,
+                    lambda qr, url=url, drop=drop: qr.build_qr_mesh(
+                        0.0, 0.0, url, drop_internal_faces=drop),
+                    None,
+                )
+
+
+def _carver_cases():
+    url = _url(URL_LENGTHS[1])
+    for card in CARD_SIZES:
+        size = "x".join("%g" % value for value in card)
+        for native in (True, False):
+            yield (
+                "carver.generate_rounded_base", {"card": size, "native": native},
+                lambda card=card: _carver(card),
+                lambda carver, native=native: carver.generate_rounded_base(3.0, native=native),
+                _needs(openscad=not native),
+            )
+            yield (
+                "carver.generate_qr_cutout_mesh", {"card": size, "native": native},
+                lambda card=card: _carver(card),
+                lambda carver, native=native: carver.generate_qr_cutout_mesh(
+                    20.0, 0.0, url, native=native),
+                _needs(openscad=not native),
+            )
+        yield (
+            "carver.fill_in_qr", {"card": size},
+            lambda card=card: _carver(card),
+            lambda carver: carver.fill_in_qr(20.0, 0.0, url, drop_internal_faces=True),
+            None,
+        )
+
+        for length in TEXT_LENGTHS:
+            fields = _text_fields(length)
+            for engine in TEXT_ENGINES:
+                params = {"card": size, "text_length": length, "text_engine": engine}
+
+                def setup(card=card, engine=engine):
+                    return _carver(card, engine)
+
+                yield (
+                    "carver.fill_in_text", params, setup,
+                    lambda carver, field=fields[0]: carver.fill_in_text(
+                        field[0], field[1], field[2], field[3]),
+                    _needs(engine),
+                )
+                yield (
+                    "carver.generate_raised_text_mesh", params, setup,
+                    lambda carver, field=fields[0]: carver.generate_raised_text_mesh(
+                        field[0], field[1], field[2], field[3]),
+                    _needs(engine),
+                )
+
+                def difference(carver, fields=fields):
+                    carver.generate_rounded_base(3.0)
+                    cutters = [carver.fill_in_text(*field) for field in fields]
+                    cutters.append(carver.generate_qr_cutout_mesh(20.0, 0.0, url))
+                    return carver.apply_difference(cutters)
+
+                yield "carver.apply_difference", params, setup, difference, _needs(engine)
+
+            params = {"card": size, "text_length": length}
+            yield (
+                "carver.render_card", params,
+                lambda card=card: _carver(card, "openscad"),
+                lambda carver, fields=fields: carver.render_card(
+                    3.0, fields, qr=(20.0, 0.0, url, "top")),
+                _needs(openscad=True),
+            )
+            yield (
+                "carver.carve_planar", params,
+                lambda card=card: _carver(card),
+                lambda carver, fields=fields: carver.carve_planar(
+                    3.0, fields, qr=(20.0, 0.0, url, "top")),
+                _needs(planar=True),
+            )
+
+
+def benchmark_cases():
+    """(name, params, setup, run, skip_reason) for every case of the grid."""
+    yield from _qr_cases()
+    yield from _carver_cases()
+
+
+def case_id(name, params):
+    return "%s[%s]" % (name, ",".join(f"{key}={value}" for key, value in params.items()))
+
+
+def reset_caches():
+    """Empties the process-wide memos, so every repeat measures a cold call."""
+    text_mesh_cache.clear()
+    _rounded_slab.cache_clear()
+    encode_qr_matrix.cache_clear()
+    try:
+        from TextEngine import get_text_engine
+    except RuntimeError:
+        return
+    get_text_engine.cache_clear()
+
+
+def _run_case(conn, index, repeat, warm):
+    """Worker process body: runs case index and sends back its measurements."""
+    try:
+        name, params, setup, run, _ = list(benchmark_cases())[index]
+        times = []
+        triangles = 0
+        for _ in range(repeat):
+            if not warm:
+                reset_caches()
+            target = setup()
+            start = time.perf_counter()
+            result = run(target)
+            times.append(time.perf_counter() - start)
+            triangles = _triangles(result)
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak_rss_kb //= 1024
+        conn.send({"times": times, "triangles": triangles, "peak_rss_kb": peak_rss_kb})
+    except Exception as exc:
+        conn.send({"error": f"{type(exc).__name__}: {exc}"})
+    finally:
+        conn.close()
+
+
+def measure(context, index, repeat, warm):
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case, args=(sender, index, repeat, warm))
+    process.start()
+    sender.close()
+    try:
+        outcome = receiver.recv()
+    except EOFError:
+        outcome = {"error": "worker died"}
+    process.join()
+    return outcome
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(repeat, warm, pattern=None):
+    # A fresh process per case keeps peak RSS per case and the caches of one
+    # case out of the next.
+    context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+    if context.get_start_method() == "forkserver":
+        context.set_forkserver_preload(["benchmark"])
+
+    results = []
+    for index, (name, params, _, _, skip) in enumerate(benchmark_cases()):
+        identifier = case_id(name, params)
+        if pattern and pattern not in identifier:
+            continue
+        entry = {"id": identifier, "name": name, "params": params}
+        if skip:
+            entry["skipped"] = skip
+        else:
+            outcome = measure(context, index, repeat, warm)
+            if "error" in outcome:
+                entry["error"] = outcome["error"]
+            else:
+                times = outcome["times"]
+                entry.update(
+                    wall_min_s=min(times),
+                    wall_median_s=statistics.median(times),
+                    wall_mean_s=statistics.fmean(times),
+                    peak_rss_kb=outcome["peak_rss_kb"],
+                    triangles=outcome["triangles"],
+                )
+        results.append(entry)
+        print(format_result(entry), flush=True)
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "openscad": openscad_version(),
+            "repeat": repeat,
+            "warm": warm,
+        },
+        "results": results,
+    }
+
+
+def format_result(entry):
+    if "skipped" in entry:
+        return f"{entry['id']}: skipped ({entry['skipped']})"
+    if "error" in entry:
+        return f"{entry['id']}: error ({entry['error']})"
+    return "%s: median %.2f ms, min %.2f ms, peak RSS %.1f MB, %d triangles" % (
+        entry["id"],
+        entry["wall_median_s"] * 1000.0,
+        entry["wall_min_s"] * 1000.0,
+        entry["peak_rss_kb"] / 1024.0,
+        entry["triangles"],
+    )
+
+
+def compare(current, baseline, threshold):
+    """Prints the median time ratio per case; returns the ids that got slower
+    than 1 + threshold times the baseline."""
+    previous = {
+        entry["id"]: entry for entry in baseline["results"] if "wall_median_s" in entry
+    }
+    regressions = []
+    for entry in current["results"]:
+        before = previous.get(entry["id"])
+        if before is None or "wall_median_s" not in entry:
+            continue
+        ratio = entry["wall_median_s"] / before["wall_median_s"]
+        flag = ""
+        if ratio > 1.0 + threshold:
+            flag = "  SLOWER"
+            regressions.append(entry["id"])
+        elif ratio < 1.0 - threshold:
+            flag = "  faster"
+        triangles = ""
+        if entry["triangles"] != before["triangles"]:
+            triangles = f", triangles {before['triangles']} -> {entry['triangles']}"
+        print(
+            "%s: %.2f ms -> %.2f ms (x%.2f), peak RSS %.1f -> %.1f MB%s%s" % (
+                entry["id"],
+                before["wall_median_s"] * 1000.0,
+                entry["wall_median_s"] * 1000.0,
+                ratio,
+                before["peak_rss_kb"] / 1024.0,
+                entry["peak_rss_kb"] / 1024.0,
+                triangles,
+                flag,
+            )
+        )
+    return regressions
+
+
+def check_volumes():
+    """Runs every geometry consistency check; returns the mismatching ids."""
+    return [
+        *_check_planar_volumes(),
+        *_check_qr_cutout(),
+        *_check_text_engine(),
+        *_check_text_threads(),
+        *_check_openscad_exchange(),
+    ]
+
+
+def _check_planar_volumes(tolerance=VOLUME_TOLERANCE):
+    """Compares the volume of the carve_planar body with the boolean of the
+    same cutters, per card size and QR side."""
+    reason = _needs(planar=True)
+    if reason is not None:
+        print(f"Volume check skipped ({reason})")
+        return []
+    url = _url(URL_LENGTHS[1])
+    fields = _text_fields(TEXT_LENGTHS[1])
+    mismatches = []
+    for card in CARD_SIZES:
+        for side in ("top", "bottom"):
+            name = case_id("volume", {"card": "x".join("%g" % value for value in card), "side": side})
+            carver = _carver(card)
+            carver.generate_rounded_base(3.0)
+            cutters = [carver.fill_in_text(*field) for field in fields]
+            cutters.append(carver.generate_qr_cutout_mesh(20.0, 0.0, url, side=side))
+            boolean = carver.apply_difference(cutters).volume
+            planar = _carver(card).carve_planar(3.0, fields, qr=(20.0, 0.0, url, side)).volume
+            flag = ""
+            if abs(planar - boolean) > tolerance:
+                flag = "  MISMATCH"
+                mismatches.append(name)
+            print("%s: boolean %.2f mm^3, planar %.2f mm^3%s" % (name, boolean, planar, flag))
+    return mismatches
+
+
+def _check_qr_cutout(tolerance=1e-3):
+    """Checks the native QR cutout (QRGenerator.build_cutout_mesh) against
+    one box per dark module, per URL length and error correction level: the
+    exact volume, and with OpenSCAD the union of one cube per module that
+    the cutout used to be rendered as."""
+    scad = openscad_version() is not None
+    if not scad:
+        print("QR cutout check against OpenSCAD skipped (OpenSCAD not available)")
+    mismatches = []
+    for ec in ERROR_CORRECTION:
+        for length in URL_LENGTHS:
+            url = _url(length)
+            carver = _carver(CARD_SIZES[0], ec=ec)
+            qr = carver.qr_generator
+            name = case_id("qr_cutout", {"url_length": length, "ec": ec})
+            mesh = carver.build_qr_cutout_mesh(0.0, 0.0, url)
+            boxes = qr.module_boxes(0.0, 0.0, url)
+            # Carver cuts depth + 0.1 mm deep, see generate_qr_cutout_mesh.
+            height = qr.depth + 0.1
+            expected = len(boxes) * qr.module_size ** 2 * height
+            line = "%s: %d modules, expected %.3f mm^3, native %.3f mm^3%s" % (
+                name, len(boxes), expected, mesh.volume,
+                "" if mesh.is_watertight else " (not watertight)")
+            ok = mesh.is_watertight and abs(mesh.volume - expected) <= tolerance
+            # A CGAL union of thousands of cubes takes minutes.
+            if scad and length <= URL_LENGTHS[1]:
+                per_module = render_scad(
+                    carver._qr_cutout_scad(
+                        [(x, y, z, size, size) for x, y, z, size in boxes.tolist()], 0.1),
+                    "qr_cutout")
+                bounds = float(np.abs(mesh.bounds - per_module.bounds).max())
+                line += ", per-module OpenSCAD %.3f mm^3, bounds off by %.4f mm" % (
+                    per_module.volume, bounds)
+                ok = ok and abs(mesh.volume - per_module.volume) <= tolerance and bounds <= tolerance
+            if not ok:
+                line += "  MISMATCH"
+                mismatches.append(name)
+            print(line)
+    return mismatches
+
+
+def _check_text_engine():
+    """Compares the native text engine with OpenSCAD text(): the area (the
+    volume of a unit-height extrusion) and the bounding box of each sample."""
+    reason = _needs("native") or _needs("openscad")
+    if reason is not None:
+        print(f"Text engine check skipped ({reason})")
+        return []
+    native = _carver(CARD_SIZES[0], "native")
+    openscad = _carver(CARD_SIZES[0], "openscad")
+    mismatches = []
+    worst_area = 0.0
+    worst_bounds = 0.0
+    for text in TEXT_SAMPLES:
+        for size in TEXT_SAMPLE_SIZES:
+            name = case_id("text", {"text": text, "size": size})
+            expected = openscad._render_text(text, size, 1.0)
+            actual = native._render_text_native(text, size, 1.0)
+            area = abs(actual.volume - expected.volume) / expected.volume
+            bounds = float(np.abs(actual.bounds - expected.bounds).max())
+            worst_area = max(worst_area, area)
+            worst_bounds = max(worst_bounds, bounds)
+            flag = ""
+            if area > TEXT_AREA_TOLERANCE or bounds > TEXT_BOUNDS_TOLERANCE:
+                flag = "  MISMATCH"
+                mismatches.append(name)
+            print("%s: area openscad %.3f mm^2, native %.3f mm^2 (%+.2f%%), bounds off by %.3f mm%s" % (
+                name, expected.volume, actual.volume,
+                (actual.volume / expected.volume - 1.0) * 100.0, bounds, flag))
+    print("text: largest area difference %.2f%% (tolerance %.2f%%), bounds %.3f mm (tolerance %.3f mm)" % (
+        worst_area * 100.0, TEXT_AREA_TOLERANCE * 100.0, worst_bounds, TEXT_BOUNDS_TOLERANCE))
+    return mismatches
+
+
+
+def _check_text_threads(threads=TEXT_THREADS, engines=TEXT_THREAD_ENGINES):
+    """Renders the text samples from several threads at once on cold
+    TextEngines, switching threads as often as possible, and compares each
+    mesh with the same string rendered on a single thread."""
+    reason = _needs("native")
+    if reason is not None:
+        print(f"Threaded text check skipped ({reason})")
+        return []
+    from TextEngine import TextEngine
+
+    samples = [(text, size) for text in TEXT_SAMPLES for size in TEXT_SAMPLE_SIZES]
+    single = TextEngine(FONT_PATH)
+    expected = {sample: single.text_mesh(*sample, 1.0).volume for sample in samples}
+
+    renders = 0
+    failures = 0
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(threads) as pool:
+            for _ in range(engines):
+                engine = TextEngine(FONT_PATH)
+                futures = [
+                    (sample, pool.submit(engine.text_mesh, *sample, 1.0))
+                    for sample in samples * threads
+                ]
+                for sample, future in futures:
+                    renders += 1
+                    try:
+                        volume = future.result().volume
+                    except Exception as exc:
+                        failures += 1
+                        print("%s: %s: %s" % (sample[0], type(exc).__name__, exc))
+                        continue
+                    if abs(volume - expected[sample]) > 1e-6:
+                        failures += 1
+    finally:
+        sys.setswitchinterval(interval)
+
+    name = case_id("text_threads", {"threads": threads})
+    print("%s: %d renders on %d cold engines, %d failed%s" % (
+        name, renders, engines, failures, "  MISMATCH" if failures else ""))
+    return [name] if failures else []
+
+
+def _exchange_modes():
+    """(pipes, result format, workspace) combinations to run OpenSCAD with:
+    the defaults and everything "auto" may pick on this build."""
+    modes = [("0", "stl"), ("0", "off")]
+    if openscad_version() >= (2021, 1):
+        modes += [("0", "binstl"), ("1", "stl"), ("1", "binstl"), ("1", "off")]
+    workspaces = [OpenSCADRunner.OPENSCAD_WORKSPACE]
+    if workspaces[0] is not None:
+        workspaces.append(None)
+    return [(pipes, fmt, workspace) for workspace in workspaces for pipes, fmt in modes]
+
+
+def _check_openscad_exchange(tolerance=1e-3):
+    """Runs one boolean through OpenSCADBackend in every exchange mode and
+    checks the result against the exact volume."""
+    version = openscad_version()
+    if version is None:
+        print("OpenSCAD exchange check skipped (OpenSCAD not available)")
+        return []
+    import trimesh
+
+    base = trimesh.creation.box((20.0, 20.0, 2.0))
+    cutters = [
+        trimesh.creation.box((5.0, 5.0, 4.0), trimesh.transformations.translation_matrix([x, 0.0, 0.0]))
+        for x in (-5.0, 5.0)
+    ]
+    expected = 20.0 * 20.0 * 2.0 - 2 * 5.0 * 5.0 * 2.0
+
+    saved = (OpenSCADRunner.OPENSCAD_PIPES, OpenSCADRunner.OPENSCAD_RESULT_FORMAT,
+             OpenSCADRunner.OPENSCAD_WORKSPACE)
+    mismatches = []
+    try:
+        for pipes, fmt, workspace in _exchange_modes():
+            OpenSCADRunner.OPENSCAD_PIPES = pipes
+            OpenSCADRunner.OPENSCAD_RESULT_FORMAT = fmt
+            OpenSCADRunner.OPENSCAD_WORKSPACE = workspace
+            name = case_id("openscad_exchange", {
+                "version": "%d.%02d" % version, "pipes": pipes, "format": fmt,
+                "workspace": workspace or "tmp"})
+            try:
+                mesh = OpenSCADBackend().difference(base, cutters)
+            except Exception as exc:
+                mismatches.append(name)
+                print("%s: %s: %s  MISMATCH" % (name, type(exc).__name__, exc))
+                continue
+            flag = ""
+            if not mesh.is_watertight or abs(mesh.volume - expected) > tolerance:
+                flag = "  MISMATCH"
+                mismatches.append(name)
+            print("%s: expected %.3f mm^3, got %.3f mm^3%s%s" % (
+                name, expected, mesh.volume,
+                "" if mesh.is_watertight else " (not watertight)", flag))
+    finally:
+        (OpenSCADRunner.OPENSCAD_PIPES, OpenSCADRunner.OPENSCAD_RESULT_FORMAT,
+         OpenSCADRunner.OPENSCAD_WORKSPACE) = saved
+    return mismatches
+
+
+# Modules the server must not load before the warm-up or a card needs them.
+HEAVY_MODULES = ("numpy", "trimesh", "Carver")
+
+_STARTUP_PROBE = """
+import sys
+from fastapi.testclient import TestClient
+import server
+response = TestClient(server.app).get("/metrics")
+print(response.status_code, *(name for name in sys.argv[1:] if name in sys.modules))
+"""
+
+
+def check_startup():
+    """Imports the server and scrapes /metrics in a fresh process; returns
+    the heavy modules that got loaded (or a description of the failure)."""
+    result = subprocess.run(
+        [sys.executable, "-c", _STARTUP_PROBE, *HEAVY_MODULES],
+        capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ, CARD_WARMUP="0"),
+    )
+    lines = result.stdout.split("\n")
+    fields = lines[-2].split() if len(lines) > 1 else []
+    if result.returncode != 0 or fields[:1] != ["200"]:
+        return [f"probe failed: {result.stderr.strip().splitlines()[-1:]}"]
+    print("import server + GET /metrics loaded: %s" % (", ".join(fields[1:]) or "none"))
+    return fields[1:]
+
+
+async def _acquire(admission, started, label, client, cost):
+    await admission.acquire(client, cost)
+    started.append(label)
+
+
+def _waiter(admission, started, label, client, cost):
+    return asyncio.ensure_future(_acquire(admission, started, label, client, cost))
+
+
+def _rejected_with(admission, client, cost):
+    """Status admission would turn client away with now, or None."""
+    try:
+        admission.check(client, cost)
+    except AdmissionRejected as e:
+        return e.status_code
+    return None
+
+
+async def _admission_fair_share():
+    # 6 slots: a lone client may hold half, the rest stays for newcomers.
+    admission = AdmissionController(2, 4)
+    started = []
+    for i in range(3):
+        _waiter(admission, started, f"a{i}", "a", 1.0)
+    await asyncio.sleep(0)
+    assert started == ["a0", "a1"], started
+    assert _rejected_with(admission, "a", 1.0) == 429
+    assert _rejected_with(admission, "b", 1.0) is None
+    for i in range(2):
+        _waiter(admission, started, f"b{i}", "b", 1.0)
+    await asyncio.sleep(0)
+    assert _rejected_with(admission, "b", 1.0) == 429
+    assert _rejected_with(admission, "c", 1.0) is None
+
+
+async def _admission_cheapest_first():
+    admission = AdmissionController(1, 100, aging=0)
+    await admission.acquire("x", 1.0)
+    started = []
+    for label, cost in (("a", 3.0), ("b", 1.0), ("c", 2.0)):
+        _waiter(admission, started, label, label, cost)
+    await asyncio.sleep(0)
+    for client in ("x", "b", "c"):
+        admission.release(client)
+        await asyncio.sleep(0)
+    assert started == ["b", "c", "a"], started
+
+
+async def _admission_fewest_running_first():
+    admission = AdmissionController(2, 100, aging=0)
+    await admission.acquire("x", 1.0)
+    await admission.acquire("y", 1.0)
+    started = []
+    # x already runs a card, so z goes first although it costs more.
+    _waiter(admission, started, "x", "x", 0.1)
+    _waiter(admission, started, "z", "z", 2.0)
+    await asyncio.sleep(0)
+    admission.release("y")
+    await asyncio.sleep(0)
+    assert started == ["z"], started
+
+
+async def _admission_aging():
+    admission = AdmissionController(1, 100, aging=1.0)
+    await admission.acquire("x", 1.0)
+    started = []
+    _waiter(admission, started, "heavy", "a", 5.0)
+    _waiter(admission, started, "cheap", "b", 1.0)
+    await asyncio.sleep(0)
+    # Ten seconds of waiting take ten units off the heavy card.
+    admission._waiting[0].enqueued -= 10.0
+    admission.release("x")
+    await asyncio.sleep(0)
+    assert started == ["heavy"], started
+
+
+async def _admission_cancellation():
+    admission = AdmissionController(1, 100)
+    await admission.acquire("x", 1.0)
+    started = []
+    waiting = _waiter(admission, started, "a", "a", 1.0)
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert admission.stats()["waiting"] == 0 and "a" not in admission._clients
+
+    # Cancelled after its slot was granted but before it ran: the slot
+    # goes to the next waiter.
+    granted = _waiter(admission, started, "b", "b", 1.0)
+    _waiter(admission, started, "c", "c", 1.0)
+    await asyncio.sleep(0)
+    admission.release("x")
+    granted.cancel()
+    await asyncio.gather(granted, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert started == ["c"], started
+    assert admission.running == 1 and "b" not in admission._clients
+
+
+ADMISSION_CHECKS = {
+    "fair_share": _admission_fair_share,
+    "cheapest_first": _admission_cheapest_first,
+    "fewest_running_first": _admission_fewest_running_first,
+    "aging": _admission_aging,
+    "cancellation": _admission_cancellation,
+}
+
+
+def check_admission():
+    """Runs each AdmissionController scenario; returns the failing ones."""
+    failures = []
+    for name, scenario in ADMISSION_CHECKS.items():
+        try:
+            asyncio.run(scenario())
+            print(f"admission[{name}]: ok")
+        except AssertionError as e:
+            failures.append(name)
+            print(f"admission[{name}]: FAILED {e}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark-results.json",
+                        help="where to write the results as JSON")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression (default 0.1)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--warm", action="store_true",
+                        help="keep the mesh and glyph caches between runs")
+    parser.add_argument("--filter", help="only run cases whose id contains this")
+    parser.add_argument("--check-volumes", action="store_true",
+                        help="only run the geometry consistency checks")
+    parser.add_argument("--check-startup", action="store_true",
+                        help="only check that /metrics does not load the geometry stack")
+    parser.add_argument("--check-admission", action="store_true",
+                        help="only check the admission controller's rules")
+    args = parser.parse_args(argv)
+
+    if args.check_startup:
+        loaded = check_startup()
+        if loaded:
+            print(f"The server loaded {', '.join(loaded)} before any card was built.")
+            return 1
+        return 0
+
+    if args.check_admission:
+        failures = check_admission()
+        if failures:
+            print(f"{len(failures)} admission check(s) failed.")
+            return 1
+        return 0
+
+    if args.check_volumes:
+        mismatches = check_volumes()
+        if mismatches:
+            print(f"{len(mismatches)} case(s) failed the geometry checks.")
+            return 1
+        return 0
+
+    results = run_benchmarks(args.repeat, args.warm, args.filter)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,91 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import Optional, Dict, Literal
-import numpy as np
-import trimesh
-import tempfile
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, model_validator
+from typing import Optional, Dict, List, Literal
 import os
 import shutil
+import contextvars
+import functools
+import gzip
+import hashlib
+import time
+import json
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from Carver import Carver
+from Admission import AdmissionController, AdmissionRejected, estimate_cost
+from BooleanBackend import BOOLEAN_BACKENDS
+from CardSession import SessionStore
+from JobManager import DONE, FAILED, JobManager
+from LazyImport import LazyImport
+from MeshCache import MeshCache, text_mesh_cache
+from Metrics import (
+    ServerTimingMiddleware,
+    counter_value,
+    histogram_totals,
+    increment,
+    meter_stream,
+    record_output,
+    render_prometheus,
+    timed,
+)
+from OpenSCADRunner import exchange_stats, openscad_version
+from PlateLayout import layout_plates
+from ResultCache import ResultCache
+from TaskGraph import TaskGraph
+from WarmUp import WarmUp
 import io  # For BytesIO
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+# The geometry stack (numpy, trimesh, scipy, the card modules) takes seconds
+# to import. It is loaded by the warm-up or the first request that needs it,
+# so the server answers /health and /ready right after it starts.
+np = LazyImport("numpy")
+trimesh = LazyImport("trimesh")
+Carver = LazyImport("Carver", "Carver")
+postprocess_mesh = LazyImport("MeshPost", "postprocess_mesh")
+export_glb = LazyImport("MeshFormats", "export_glb")
+export_stl = LazyImport("MeshFormats", "export_stl")
+export_3mf = LazyImport("ThreeMFWriter", "export_3mf")
+iter_3mf = LazyImport("ThreeMFWriter", "iter_3mf")
+iter_zip = LazyImport("ThreeMFWriter", "iter_zip")
+dark_module_count = LazyImport("QRGenerator", "dark_module_count")
+
+# "1" warms the process up in the background at startup (imports, OpenSCAD
+# and its font cache, the in-process caches) and /ready answers 503 until
+# that is done; "0" is ready at once and pays all of it on first use.
+WARMUP = os.environ.get("CARD_WARMUP", "1") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    get_result_cache()
+    if WARMUP:
+        warm_up.start()
+    else:
+        warm_up.skip()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Response headers a browser page on another origin (the frontend) may read:
+# the stage timings, the ETag to send back as If-None-Match, and the
+# per-endpoint details set by /generate and /sessions.
+EXPOSED_HEADERS = [
+    "Server-Timing",
+    "ETag",
+    "X-Card-Cost",
+    "X-Encode-Ms",
+    "X-Output-Bytes",
+    "X-Session-Id",
+    "X-Rebuilt-Nodes",
+]
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,7 +93,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=EXPOSED_HEADERS,
 )
+app.add_middleware(ServerTimingMiddleware)
 
 # Default constants
 # To change the font, set the CARD_FONT environment variable or change this default.
@@ -30,6 +104,160 @@ DEFAULT_FONT_PATH = os.path.join(os.path.dirname(__file__), "fonts/Monocraft-Bol
 DEFAULT_DEPTH = 0.4
 DEFAULT_QR_MODULE_SIZE = 1.35
 DEFAULT_QR_BORDER = 2
+# Every card gets these rounded corners, whatever design.filletRadius says.
+FILLET_RADIUS = 3.0
+# "multi" runs OpenSCAD once per part, "single" renders the whole card in one
+# OpenSCAD program, "planar" carves the pockets in 2D without any 3D boolean.
+RENDER_MODE = os.environ.get("CARD_RENDER_MODE", "multi")
+# "openscad" renders text with OpenSCAD's text(), "native" tessellates the
+# font in-process (needs fonttools, shapely and mapbox_earcut). native is
+# experimental until benchmark.py --check-volumes has compared it with a
+# real OpenSCAD.
+TEXT_ENGINE = os.environ.get("CARD_TEXT_ENGINE", "openscad")
+# Post-processing of the finished meshes before export: "off", "weld"
+# (weld vertices, drop degenerate and duplicate faces) or "full" (weld and
+# re-triangulate coplanar patches, which needs shapely).
+MESH_POSTPROCESS = os.environ.get("CARD_MESH_POSTPROCESS", "off")
+
+# Card generation runs on a dedicated executor so it never blocks the event
+# loop. Requests beyond the workers plus the wait queue get a 503.
+GENERATE_WORKERS = int(os.environ.get("GENERATE_WORKERS", os.cpu_count() or 1))
+GENERATE_QUEUE_SIZE = int(os.environ.get("GENERATE_QUEUE_SIZE", 16))
+GENERATE_RETRY_AFTER = int(os.environ.get("GENERATE_RETRY_AFTER", 5))
+# Admission by estimated cost, in units of a typical card (see
+# Admission.estimate_cost): cards above GENERATE_MAX_COST are refused,
+# cards from GENERATE_HEAVY_COST up are refused while the queue is at
+# least half full. A waiting card counts one unit cheaper every
+# GENERATE_AGING seconds. 0 disables a limit.
+GENERATE_MAX_COST = float(os.environ.get("GENERATE_MAX_COST", 25))
+GENERATE_HEAVY_COST = float(os.environ.get("GENERATE_HEAVY_COST", 4))
+GENERATE_AGING = float(os.environ.get("GENERATE_AGING", 10))
+
+generate_executor = ThreadPoolExecutor(
+    max_workers=GENERATE_WORKERS, thread_name_prefix="generate")
+
+# The independent stages of a card (base, each text field, QR code) run in
+# parallel on these threads, shared by every card being built; OpenSCAD
+# processes stay bounded by OPENSCAD_MAX_PROCS. 1 runs them in sequence.
+CARD_TASK_WORKERS = int(os.environ.get("CARD_TASK_WORKERS", os.cpu_count() or 1))
+card_task_executor = (
+    ThreadPoolExecutor(max_workers=CARD_TASK_WORKERS, thread_name_prefix="card-task")
+    if CARD_TASK_WORKERS > 1
+    else None
+)
+admission = AdmissionController(
+    GENERATE_WORKERS,
+    GENERATE_QUEUE_SIZE,
+    max_cost=GENERATE_MAX_COST,
+    heavy_cost=GENERATE_HEAVY_COST,
+    aging=GENERATE_AGING,
+)
+
+# Batches fan their cards out over worker processes, so the CPU-bound
+# geometry work is not serialized by the GIL.
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_MAX_CARDS = int(os.environ.get("BATCH_MAX_CARDS", 500))
+# Default print bed (mm) for plate output; requests can override it.
+BATCH_BED_WIDTH = float(os.environ.get("BATCH_BED_WIDTH", 256))
+BATCH_BED_DEPTH = float(os.environ.get("BATCH_BED_DEPTH", 256))
+BATCH_PLATE_SPACING = float(os.environ.get("BATCH_PLATE_SPACING", 5))
+
+_batch_executor = None
+
+# Formats /generate can answer with, by name: (media type, file extension,
+# media types that select it in Accept). 3MF is the default and comes
+# first, so it wins ties.
+OUTPUT_FORMATS = {
+    "3mf": ("model/3mf", "3mf", ("model/3mf", "application/vnd.ms-package.3dmanufacturing-3dmodel+xml")),
+    "glb": ("model/gltf-binary", "glb", ("model/gltf-binary",)),
+    "stl": ("model/stl", "stl", ("model/stl", "application/sla", "application/vnd.ms-pki.stl")),
+}
+# 3MF packages are deflated already; the other formats are gzipped for
+# clients that accept it.
+GZIP_FORMATS = ("glb", "stl")
+GZIP_LEVEL = int(os.environ.get("CARD_GZIP_LEVEL", 6))
+
+# Finished cards are cached on disk, per format, by a hash of everything
+# that shapes them, so re-posting the same payload costs a file read. Set
+# the budget to 0 to disable the cache.
+RESULT_CACHE_DIR = os.environ.get(
+    "RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "card-result-cache"))
+RESULT_CACHE_BYTES = int(os.environ.get("RESULT_CACHE_BYTES", 512 * 1024 * 1024))
+# Bump when a code change alters the generated geometry, so stale results
+# are not served under the new code.
+RESULT_CACHE_VERSION = 1
+
+
+
+@functools.lru_cache(maxsize=None)
+def get_result_cache():
+    """The result cache, or None when disabled.
+
+    Built on first use (or at startup) rather than at import, so the batch
+    and job worker processes, which import this module, never open it.
+    """
+    if RESULT_CACHE_BYTES <= 0:
+        return None
+    return ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_BYTES)
+
+
+# Editor sessions keep their intermediate meshes between renders. Idle
+# sessions expire; beyond the memory budget the least recently used
+# sessions drop their meshes and rebuild on their next render.
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 15 * 60))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 256 * 1024 * 1024))
+SESSION_MAX_COUNT = int(os.environ.get("SESSION_MAX_COUNT", 1000))
+
+session_store = SessionStore(SESSION_TTL, SESSION_MAX_BYTES, SESSION_MAX_COUNT)
+
+# Asynchronous jobs run in worker processes; finished results are kept for
+# JOB_RESULT_TTL seconds.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", os.cpu_count() or 1))
+JOB_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", 10 * 60))
+JOB_MAX_ACTIVE = int(os.environ.get("JOB_MAX_ACTIVE", 64))
+
+# The fork server imports the geometry modules up front, so jobs do not
+# pay for them.
+job_manager = JobManager(
+    JOB_WORKERS, JOB_RESULT_TTL, JOB_MAX_ACTIVE,
+    preload=["numpy", "trimesh", "Carver", "MeshFormats", "ThreeMFWriter", "server"])
+# Jobs waiting for admission: job id -> the task that starts the job.
+pending_jobs = {}
+
+
+# Previews skip the boolean difference and use coarser arcs; they run on
+# their own executor so they never wait behind full renders. At most
+# PREVIEW_QUEUE_SIZE previews wait for a worker; beyond that /preview
+# answers 503.
+PREVIEW_SEGMENTS = int(os.environ.get("PREVIEW_SEGMENTS", 16))
+PREVIEW_WORKERS = int(os.environ.get("PREVIEW_WORKERS", 2))
+PREVIEW_QUEUE_SIZE = int(os.environ.get("PREVIEW_QUEUE_SIZE", 8))
+PREVIEW_CACHE_BYTES = int(os.environ.get("PREVIEW_CACHE_BYTES", 16 * 1024 * 1024))
+# The QR overlay is flush with the card face in the carved card; in the
+# preview it is lifted this much (mm) so it does not z-fight with the base.
+PREVIEW_OVERLAY_LIFT = 0.02
+PREVIEW_BASE_COLOR = "#784e97"
+PREVIEW_FONT_COLOR = "#ffffff"
+
+preview_executor = ThreadPoolExecutor(
+    max_workers=PREVIEW_WORKERS, thread_name_prefix="preview")
+# Previews submitted to preview_executor and not finished yet. Only touched
+# from the event loop.
+previews_pending = 0
+# QR overlays built at the origin, by everything but their position.
+preview_qr_cache = MeshCache(PREVIEW_CACHE_BYTES)
+
+
+def get_batch_executor():
+    """Process pool for batch cards, started on first use."""
+    global _batch_executor
+    if _batch_executor is None:
+        # spawn: forking a server that already runs threads is unsafe.
+        _batch_executor = ProcessPoolExecutor(
+            max_workers=BATCH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _batch_executor
 
 # Models match the provided JSON structure
 
@@ -43,6 +271,17 @@ class Design(BaseModel):
     filletRadius: float
     thickness: float
     dimensions: Dimensions
+    # Only used by /preview; printed cards take the filament's color.
+    color: Optional[str] = None
+    fontColor: Optional[str] = None
+
+    @model_validator(mode="after")
+    def fits_fillet(self):
+        if min(self.dimensions.width, self.dimensions.height) <= 2 * FILLET_RADIUS:
+            raise ValueError(
+                f"Card width and height must be more than {2 * FILLET_RADIUS:g} mm "
+                "to fit the rounded corners.")
+        return self
 
 
 class Content(BaseModel):
@@ -75,143 +314,1215 @@ class CardRequest(BaseModel):
     positions: PositionsMap
 
 
-@app.post("/generate")
-async def generate_card(request: CardRequest):
-    try:
-        # Extract parameters
-        width = request.design.dimensions.width
-        height = request.design.dimensions.height
-        thickness = request.design.thickness
-
-        # Dimensions array: [width, height, thickness]
-        box_extents = np.array([width, height, thickness])
-
-        # Initialize Carver
-        carver = Carver(
-            box_extents,
-            DEFAULT_FONT,
-            DEFAULT_DEPTH,
-            qr_module_size=DEFAULT_QR_MODULE_SIZE,
-            qr_border=DEFAULT_QR_BORDER,
-            font_path=DEFAULT_FONT_PATH
-        )
+class BatchCard(BaseModel):
+    content: Content
+    positions: PositionsMap
 
-        # Create base mesh with fillet
-        # Using 3mm as requested (or from request.design.filletRadius if preferred, likely 3)
-        fillet_radius = request.design.filletRadius if request.design.filletRadius > 0 else 3.0
-        # Hardcoding 3mm as per user request just to be safe it's applied "on every side"
-        fillet_radius = 3.0
-        
-        box_mesh = carver.generate_rounded_base(fillet_radius)
-        # carver.mesh is already set inside generate_rounded_base
-
-        # Helper to map face to side
-        def get_qr_side_position(face_str: str):
-            if face_str.lower() in ["back", "bottom"]:
-                return "bottom"
-            return "top"
-
-        # Process Text Fields
-        fields_to_process = [
-            ("name", request.content.name, request.positions.name),
-            ("jobTitle", request.content.jobTitle, request.positions.jobTitle),
-            ("school", request.content.school, request.positions.school),
-            ("email", request.content.email, request.positions.email),
-            ("phone", request.content.phoneNumber, request.positions.phone),
-        ]
 
-        text_meshes_for_scene = []
-        meshes_to_subtract = []
-
-        for field_name, text_value, position in fields_to_process:
-            if not text_value:
-                continue
-                
-            # Set text height based on field
-            current_text_height = 4.5 if field_name == "name" else 3.1
-
-            # Generate the text mesh (positive volume) - Standard depth for subtraction
-            txt_mesh_subtraction = carver.fill_in_text(
-                position.x,
-                position.y,
-                text=text_value,
-                text_height=current_text_height,
+class BedSize(BaseModel):
+    width: float = BATCH_BED_WIDTH
+    depth: float = BATCH_BED_DEPTH
+    spacing: float = BATCH_PLATE_SPACING
+
+
+class BatchRequest(BaseModel):
+    metadata: Optional[Dict] = {}
+    design: Design
+    cards: List[BatchCard]
+    # "cards" returns one 3MF per card, "plates" lays the cards out on print
+    # beds and returns one 3MF per plate; either way inside a zip.
+    output: Literal["cards", "plates"] = "cards"
+    bed: Optional[BedSize] = None
+
+
+def no_progress(stage, state):
+    pass
+
+
+@contextmanager
+def card_stage(progress, name):
+    """Reports stage name as running, then done once the block completes."""
+    progress(name, "running")
+    yield
+    progress(name, "done")
+
+
+def card_stages(text_fields):
+    """Names of the progress stages of a card, in pipeline order."""
+    return ["base", *(f"text:{field[0]}" for field in text_fields), "qr", "boolean", "export"]
+
+
+def render_card_multi_pass(
+    carver, fillet_radius, text_fields, qr, progress=no_progress, executor=None
+):
+    """Builds the carved body, raised text and QR fill with one OpenSCAD call per part.
+
+    text_fields is a list of (field_name, x, y, text, text_height). The
+    base, each text field and the QR code are independent tasks, run in
+    parallel on executor (one after another without one); only the
+    boolean waits for all of them.
+    """
+    graph = TaskGraph()
+    # The tasks share carver, so they only call its build_* methods, which
+    # do not change it.
+    graph.add("base", functools.partial(carver.build_rounded_base, fillet_radius))
+
+    text_stages = []
+    for field_name, x, y, text_value, text_height in text_fields:
+        def text_meshes(x=x, y=y, text=text_value, text_height=text_height):
+            # The carve cutter at the standard depth and the raised text
+            # (0.4 mm above the surface) for the scene. Both are scaled from
+            # the same cached outline, so they stay in one task.
+            return (
+                carver.fill_in_text(x, y, text=text, text_height=text_height),
+                carver.generate_raised_text_mesh(
+                    x, y, text=text, text_height=text_height, extra_height=0.4),
             )
 
-            # Generate the text mesh (raised volume) - For display/export
-            # Raised 0.4mm above surface (default extra_height=0.4 in the method)
-            txt_mesh_raised = carver.generate_raised_text_mesh(
-                position.x,
-                position.y,
-                text=text_value,
-                text_height=current_text_height,
-                extra_height=0.4  # Explicitly requesting 0.4mm raised
+        text_stages.append(graph.add(f"text:{field_name}", text_meshes))
+
+    qr_x, qr_y, qr_url, qr_side = qr
+
+    def qr_meshes():
+        cutout = carver.build_qr_cutout_mesh(qr_x, qr_y, url=qr_url, side=qr_side)
+        fill = carver.fill_in_qr(
+            qr_x, qr_y, url=qr_url, side=qr_side, drop_internal_faces=True)
+        return cutout, fill
+
+    graph.add("qr", qr_meshes)
+
+    def boolean(base, *parts):
+        *texts, (qr_cutout_mesh, _) = parts
+        # Apply all subtractions in one go
+        return carver.difference(
+            base, [cutter for cutter, _ in texts] + [qr_cutout_mesh])
+
+    graph.add("boolean", boolean, deps=["base", *text_stages, "qr"])
+    results = graph.run(executor, progress)
+    return (
+        results["boolean"],
+        [results[stage][1] for stage in text_stages],
+        results["qr"][1],
+    )
+
+
+def card_inputs(request: CardRequest):
+    """Turns a request into Carver inputs.
+
+    Returns (carver, fillet_radius, text_fields, qr), see card_text_fields
+    and card_qr.
+    """
+    # Extract parameters
+    width = request.design.dimensions.width
+    height = request.design.dimensions.height
+    thickness = request.design.thickness
+
+    # Dimensions array: [width, height, thickness]
+    box_extents = np.array([width, height, thickness])
+
+    # Initialize Carver
+    carver = Carver(
+        box_extents,
+        DEFAULT_FONT,
+        DEFAULT_DEPTH,
+        qr_module_size=DEFAULT_QR_MODULE_SIZE,
+        qr_border=DEFAULT_QR_BORDER,
+        font_path=DEFAULT_FONT_PATH,
+        text_engine=TEXT_ENGINE,
+    )
+
+    # Create base mesh with fillet
+    # Using 3mm as requested (or from request.design.filletRadius if preferred, likely 3)
+    fillet_radius = request.design.filletRadius if request.design.filletRadius > 0 else 3.0
+    # Hardcoding 3mm as per user request just to be safe it's applied "on every side"
+    fillet_radius = FILLET_RADIUS
+
+    return carver, fillet_radius, card_text_fields(request), card_qr(request)
+
+
+def card_text_fields(request: CardRequest):
+    """(field_name, x, y, text, text_height) of every non-empty text field."""
+    # Process Text Fields
+    fields_to_process = [
+        ("name", request.content.name, request.positions.name),
+        ("jobTitle", request.content.jobTitle, request.positions.jobTitle),
+        ("school", request.content.school, request.positions.school),
+        ("email", request.content.email, request.positions.email),
+        ("phone", request.content.phoneNumber, request.positions.phone),
+    ]
+
+    text_fields = []
+    for field_name, text_value, position in fields_to_process:
+        if not text_value:
+            continue
+
+        # Set text height based on field
+        current_text_height = 4.5 if field_name == "name" else 3.1
+        text_fields.append(
+            (field_name, position.x, position.y, text_value, current_text_height))
+    return text_fields
+
+
+def card_qr(request: CardRequest):
+    """(x, y, url, side) of the QR code."""
+    # Helper to map face to side
+    def get_qr_side_position(face_str: str):
+        if face_str.lower() in ["back", "bottom"]:
+            return "bottom"
+        return "top"
+
+    # Process QR Code
+    qr_pos = request.positions.qrCode
+    qr_side = get_qr_side_position(qr_pos.face)
+    return (qr_pos.x, qr_pos.y, request.content.qrUrl, qr_side)
+
+
+def card_cost(request: CardRequest):
+    """Pre-flight cost estimate of a card, from its non-empty fields, their
+    glyphs and the dark modules of its QR code."""
+    text_fields = card_text_fields(request)
+    glyphs = sum(len("".join(text.split())) for _, _, _, text, _ in text_fields)
+    _, _, qr_url, _ = card_qr(request)
+    modules = dark_module_count(qr_url, DEFAULT_QR_BORDER)
+    return estimate_cost(len(text_fields) + 1, glyphs, modules)
+
+
+def client_id(raw_request: Request):
+    """Key for per-client fair share: the peer address (run uvicorn with
+    --proxy-headers behind a proxy)."""
+    return raw_request.client.host if raw_request.client else "unknown"
+
+
+def count_card(scene, mode):
+    increment("card_cards_total", mode=mode)
+    increment(
+        "card_triangles_total",
+        sum(len(mesh.faces) for mesh in scene.geometry.values()),
+        mode=mode,
+    )
+
+
+def postprocess_card_mesh(mesh):
+    """Applies MESH_POSTPROCESS to one of the card's meshes."""
+    if MESH_POSTPROCESS == "off" or len(mesh.faces) == 0:
+        return mesh
+    if MESH_POSTPROCESS not in ("weld", "full"):
+        raise ValueError(f"Unsupported mesh post-processing: {MESH_POSTPROCESS!r}")
+    with timed("mesh_post"):
+        mesh, stats = postprocess_mesh(mesh, merge_coplanar=MESH_POSTPROCESS == "full")
+    increment(
+        "card_postprocess_triangles_removed_total",
+        stats["triangles_before"] - stats["triangles_after"],
+    )
+    increment(
+        "card_postprocess_bytes_removed_total",
+        stats["bytes_before"] - stats["bytes_after"],
+    )
+    return mesh
+
+
+def assemble_card_scene(box_mesh, text_meshes, qr_mesh, postprocess=True) -> "trimesh.Scene":
+    if postprocess:
+        box_mesh = postprocess_card_mesh(box_mesh)
+        text_meshes = [postprocess_card_mesh(mesh) for mesh in text_meshes]
+        qr_mesh = postprocess_card_mesh(qr_mesh)
+
+    scene = trimesh.Scene()
+    scene.add_geometry(box_mesh, node_name="card_body")
+
+    for i, tm in enumerate(text_meshes):
+        scene.add_geometry(tm, node_name=f"text_{i}")
+
+    scene.add_geometry(qr_mesh, node_name="qr_code")
+    return scene
+
+
+def build_card_scene(
+    request: CardRequest, progress=no_progress, parallel=True
+) -> "trimesh.Scene":
+    """Runs the full card pipeline: base, text and QR carving and the raised parts.
+
+    This is blocking work, so it runs on generate_executor instead of the
+    event loop. progress(stage, state) is called as each of card_stages()
+    starts ("running") and ends ("done"), except "export", which is up to
+    the caller. With parallel, the independent stages run at the same time
+    on card_task_executor.
+    """
+    executor = card_task_executor if parallel else None
+    carver, fillet_radius, named_fields, qr = card_inputs(request)
+    text_fields = [field[1:] for field in named_fields]
+    qr_x, qr_y, qr_url, qr_side = qr
+
+    if RENDER_MODE == "single":
+        # Base, carving and raised text in one OpenSCAD program, so every
+        # stage runs at once.
+        stages = card_stages(named_fields)[:-1]
+        for stage in stages:
+            progress(stage, "running")
+        # The QR fill is built while OpenSCAD renders the rest.
+        graph = TaskGraph()
+        graph.add(
+            "card",
+            functools.partial(
+                carver.build_card, fillet_radius, text_fields, qr=qr, extra_height=0.4),
+        )
+        graph.add(
+            "qr",
+            functools.partial(
+                carver.fill_in_qr, qr_x, qr_y, url=qr_url, side=qr_side,
+                drop_internal_faces=True),
+        )
+        results = graph.run(executor)
+        box_mesh, text_meshes_for_scene = results["card"]
+        qr_mesh = results["qr"]
+        for stage in stages:
+            progress(stage, "done")
+    elif RENDER_MODE == "planar":
+        # The planar carve builds the outline and cuts the pockets itself,
+        # so with native text it does not wait for the raised parts. OpenSCAD
+        # text pockets are cut from the outlines the raised text rendered.
+        graph = TaskGraph()
+        graph.add("base", lambda: None)
+        text_stages = [
+            graph.add(
+                f"text:{field_name}",
+                functools.partial(
+                    carver.generate_raised_text_mesh,
+                    x, y, text=text_value, text_height=text_height, extra_height=0.4),
             )
+            for field_name, x, y, text_value, text_height in named_fields
+        ]
+        graph.add(
+            "qr",
+            functools.partial(
+                carver.fill_in_qr, qr_x, qr_y, url=qr_url, side=qr_side,
+                drop_internal_faces=True),
+        )
+        graph.add(
+            "boolean",
+            lambda *_: carver.build_planar_body(fillet_radius, text_fields, qr=qr),
+            deps=["base", *(text_stages if TEXT_ENGINE != "native" else ())],
+        )
+        results = graph.run(executor, progress)
+        box_mesh = results["boolean"]
+        text_meshes_for_scene = [results[stage] for stage in text_stages]
+        qr_mesh = results["qr"]
+    else:
+        box_mesh, text_meshes_for_scene, qr_mesh = render_card_multi_pass(
+            carver, fillet_radius, named_fields, qr, progress, executor)
+
+    # Assemble Scene
+    scene = assemble_card_scene(box_mesh, text_meshes_for_scene, qr_mesh)
+    count_card(scene, RENDER_MODE)
+    return scene
+
+
+def build_card_job(request: CardRequest, progress=no_progress) -> bytes:
+    """Job entry point: builds the card and returns the 3MF bytes."""
+    scene = build_card_scene(request, progress)
+    with card_stage(progress, "export"), timed("export_3mf"):
+        return export_3mf(scene)
+
+
+def render_session(session, patch=None):
+    """Renders a session's current request, rebuilding only what changed.
+
+    With patch, renders the request with patch merged in, and keeps the edit
+    in the session only once the render succeeded.
+
+    Returns (scene, rebuilt_node_names). Sessions always build the parts
+    separately ("single" mode renders like "multi"), since one SCAD program
+    for the whole card cannot be updated piecewise.
+    """
+    with session.lock:
+        request = session.request
+        if patch is not None:
+            # Merged under the lock, so concurrent edits build on each other.
+            request = patched_request(request, patch)
+        carver, fillet_radius, text_fields, qr = card_inputs(request)
+        body, raised, qr_mesh, rebuilt = session.render(
+            carver, fillet_radius, text_fields, qr, planar=RENDER_MODE == "planar")
+        scene = assemble_card_scene(body, raised, qr_mesh)
+        session.request = request
+    count_card(scene, "session")
+    session_store.enforce_budget()
+    return scene, rebuilt
+
+
+@functools.lru_cache(maxsize=None)
+def _font_digest(font_path):
+    with open(font_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def card_cache_key(request: CardRequest) -> str:
+    """Content hash of a card: the request minus metadata, plus the server
+    settings that change the geometry."""
+    canonical = {
+        "request": request.model_dump(
+            exclude={"metadata": True, "design": {"color", "fontColor"}}),
+        "version": RESULT_CACHE_VERSION,
+        "depth": DEFAULT_DEPTH,
+        "qr_module_size": DEFAULT_QR_MODULE_SIZE,
+        "qr_border": DEFAULT_QR_BORDER,
+        "font": DEFAULT_FONT,
+        "font_file": _font_digest(DEFAULT_FONT_PATH),
+        "render_mode": RENDER_MODE,
+        "text_engine": TEXT_ENGINE,
+        "mesh_postprocess": MESH_POSTPROCESS,
+        "boolean_backend": BOOLEAN_BACKENDS,
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against etag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
+
+
+def parse_header_list(value):
+    """(token, q) pairs of an Accept-style header, lower-cased."""
+    items = []
+    for part in (value or "").split(","):
+        token, *params = [piece.strip() for piece in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        items.append((token.lower(), q))
+    return items
+
+
+def negotiate_format(accept):
+    """Output format for an Accept header, or None if none is acceptable.
+
+    Each format takes the q of the most specific range matching one of its
+    media types; the highest q wins, ties go to the earlier format.
+    """
+    if not accept:
+        return "3mf"
+    ranges = parse_header_list(accept)
+    best, best_q = None, 0.0
+    for name, (_, _, media_types) in OUTPUT_FORMATS.items():
+        q, specificity = None, -1
+        for media_range, range_q in ranges:
+            for media_type in media_types:
+                if media_range == media_type:
+                    match = 2
+                elif media_range == media_type.split("/")[0] + "/*":
+                    match = 1
+                elif media_range == "*/*":
+                    match = 0
+                else:
+                    continue
+                if match > specificity:
+                    q, specificity = range_q, match
+        if q is not None and q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def accepts_gzip(accept_encoding):
+    codings = dict(parse_header_list(accept_encoding))
+    if "gzip" in codings:
+        return codings["gzip"] > 0
+    return codings.get("*", 0) > 0
+
+
+def encode_scene(scene, output_format):
+    """Serializes a card scene as output_format and returns the bytes."""
+    with timed(f"export_{output_format}"):
+        if output_format == "glb":
+            return export_glb(scene)
+        if output_format == "stl":
+            return export_stl(scene)
+        return export_3mf(scene)
+
+
+def build_card_file(request: CardRequest, output_format, cache_key=None):
+    """Builds the card and returns (bytes in output_format, encode seconds),
+    storing them in the result cache under cache_key."""
+    scene = build_card_scene(request)
+    start = time.perf_counter()
+    data = encode_scene(scene, output_format)
+    seconds = time.perf_counter() - start
+    result_cache = get_result_cache()
+    if cache_key is not None and result_cache is not None:
+        result_cache.put(cache_key, data)
+    return data, seconds
+
+
+def cached_stream(key, chunks):
+    """Passes chunks through while writing them to the result cache.
+
+    The entry is only committed once the stream completes, so a client that
+    disconnects midway leaves nothing behind.
+    """
+    with get_result_cache().writer(key) as cache_file:
+        for chunk in chunks:
+            cache_file.write(chunk)
+            yield chunk
+
+
+def preview_cache_key(request: CardRequest) -> str:
+    """Content hash of a preview: the card's key plus colors and preview settings."""
+    canonical = {
+        "card": card_cache_key(request),
+        "colors": [request.design.color, request.design.fontColor],
+        "segments": PREVIEW_SEGMENTS,
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def preview_material(hex_color, default):
+    """PBR material of a "#rrggbb" color, falling back to default if invalid."""
+    value = (hex_color or default).lstrip("#")
+    try:
+        rgb = [int(value[i:i + 2], 16) for i in (0, 2, 4)] if len(value) == 6 else None
+    except ValueError:
+        rgb = None
+    if rgb is None:
+        return preview_material(default, default)
+    return trimesh.visual.material.PBRMaterial(
+        baseColorFactor=[*rgb, 255], metallicFactor=0.0, roughnessFactor=0.8)
+
+
+def build_preview_scene(request: CardRequest) -> "trimesh.Scene":
+    """A visual stand-in for the card: the uncarved base with the raised text
+    and the QR code laid over it as separate meshes.
 
-            # For carving text, we subtract the standard depth mesh 
-            meshes_to_subtract.append(txt_mesh_subtraction)
-            
-            # For the scene, we add the raised mesh
-            text_meshes_for_scene.append(txt_mesh_raised)
-
-        # Process QR Code
-        qr_pos = request.positions.qrCode
-        qr_side = get_qr_side_position(qr_pos.face)
-        
-        # Get QR cutout mesh
-        qr_cutout_mesh = carver.generate_qr_cutout_mesh(
-            qr_pos.x,
-            qr_pos.y,
-            url=request.content.qrUrl,
-            side=qr_side
+    No boolean runs. Arcs use PREVIEW_SEGMENTS, and the base, text and QR
+    meshes come from their caches (the text cache is shared with full
+    renders, so the later export reuses the preview's text).
+    """
+    carver, fillet_radius, named_fields, qr = card_inputs(request)
+    base = carver.generate_rounded_base(fillet_radius, segments=PREVIEW_SEGMENTS)
+    texts = [
+        carver.generate_raised_text_mesh(x, y, text=text, text_height=text_height, extra_height=0.4)
+        for _, x, y, text, text_height in named_fields
+    ]
+
+    qr_x, qr_y, qr_url, qr_side = qr
+    qr_generator = carver.qr_generator
+    key = (
+        qr_url,
+        qr_side,
+        qr_generator.module_size,
+        qr_generator.border,
+        qr_generator.depth,
+        float(carver.box_extents[2]),
+    )
+    qr_mesh = preview_qr_cache.get_or_create(
+        key,
+        lambda: carver.fill_in_qr(0.0, 0.0, url=qr_url, side=qr_side, drop_internal_faces=True),
+    )
+    lift = PREVIEW_OVERLAY_LIFT if qr_side == "top" else -PREVIEW_OVERLAY_LIFT
+    qr_mesh.apply_translation([qr_x, qr_y, lift])
+
+    base_material = preview_material(request.design.color, PREVIEW_BASE_COLOR)
+    font_material = preview_material(request.design.fontColor, PREVIEW_FONT_COLOR)
+    base.visual = trimesh.visual.TextureVisuals(material=base_material)
+    for mesh in [*texts, qr_mesh]:
+        mesh.visual = trimesh.visual.TextureVisuals(material=font_material)
+
+    scene = assemble_card_scene(base, texts, qr_mesh, postprocess=False)
+    count_card(scene, "preview")
+    return scene
+
+
+def build_preview_glb(request: CardRequest) -> bytes:
+    scene = build_preview_scene(request)
+    with timed("export_glb"):
+        return export_glb(scene)
+
+
+def render_batch_card(design, card, output):
+    """Builds one card of a batch inside a worker process.
+
+    Returns the 3MF bytes for "cards" output, or the list of
+    (node_name, vertices, faces) parts for "plates" output. The rounded
+    base and the glyphs are memoized per process, so each worker builds
+    them once per design.
+    """
+    # The batch already runs its cards in parallel processes.
+    scene = build_card_scene(
+        CardRequest(design=design, content=card.content, positions=card.positions),
+        parallel=False)
+    if output == "cards":
+        return export_3mf(scene)
+
+    parts = []
+    for node in scene.graph.nodes_geometry:
+        matrix, geometry_name = scene.graph[node]
+        mesh = scene.geometry[geometry_name]
+        if len(mesh.faces) == 0:
+            continue
+        parts.append((node, trimesh.transform_points(mesh.vertices, matrix), mesh.faces))
+    return parts
+
+
+def build_plate_scenes(design, cards_parts, bed):
+    """Lays the batch's cards out on plates, one trimesh.Scene per plate.
+
+    Cards are built centred on z=0; each is lifted so its base rests on the
+    bed plane (z=0).
+    """
+    plates = layout_plates(
+        len(cards_parts),
+        design.dimensions.width,
+        design.dimensions.height,
+        bed.width,
+        bed.depth,
+        bed.spacing,
+    )
+    for plate in plates:
+        scene = trimesh.Scene()
+        for index, x, y, rotated in plate:
+            bottom = min(
+                (float(vertices[:, 2].min()) for _, vertices, _ in cards_parts[index]),
+                default=0.0,
+            )
+            transform = trimesh.transformations.translation_matrix([x, y, -bottom])
+            if rotated:
+                transform = transform @ trimesh.transformations.rotation_matrix(
+                    np.pi / 2.0, [0.0, 0.0, 1.0])
+            for node, vertices, faces in cards_parts[index]:
+                scene.add_geometry(
+                    trimesh.Trimesh(vertices=vertices, faces=faces, process=False),
+                    node_name=f"card_{index:03d}_{node}",
+                    geom_name=f"card_{index:03d}_{node}",
+                    transform=transform,
+                )
+        yield scene
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+# Built by the warm-up: short strings with the characters cards usually
+# have, a QR code on the back and a rounded base.
+WARMUP_CARD = {
+    "design": {"filletRadius": 3, "thickness": 1.6, "dimensions": {"width": 85, "height": 54}},
+    "content": {
+        "name": "Warm Up",
+        "email": "warm.up@example.com",
+        "jobTitle": "Engineer",
+        "phoneNumber": "555-0100",
+        "qrUrl": "https://example.com/",
+    },
+    "positions": {
+        "name": {"x": -36.5, "y": 21},
+        "jobTitle": {"x": -36.5, "y": 13},
+        "phone": {"x": -36.5, "y": -21},
+        "email": {"x": -36.5, "y": -15},
+        "qrCode": {"x": 0, "y": 0, "face": "back"},
+    },
+}
+
+
+def warm_imports():
+    for module in (np, trimesh, Carver, postprocess_mesh, export_glb, export_3mf):
+        module.load()
+
+
+def openscad_required():
+    """Whether cards cannot be built without OpenSCAD in this configuration.
+
+    Planar cards only use it for the text. Multi-pass cards with native
+    text only fall back to it when the manifold boolean fails.
+    """
+    if RENDER_MODE == "single" or TEXT_ENGINE == "openscad":
+        return True
+    if RENDER_MODE == "planar":
+        return False
+    return "manifold" not in (name.strip() for name in BOOLEAN_BACKENDS.split(","))
+
+
+def warm_openscad():
+    """Checks that OpenSCAD runs; the card step then builds its font cache."""
+    if RENDER_MODE == "planar" and TEXT_ENGINE == "native":
+        return
+    if openscad_version() is None:
+        raise RuntimeError("OpenSCAD did not report its version.")
+
+
+def warm_card():
+    scene = build_card_scene(CardRequest.model_validate(WARMUP_CARD))
+    with timed("export_3mf"):
+        export_3mf(scene)
+
+
+def warm_preview():
+    build_preview_glb(CardRequest.model_validate(WARMUP_CARD))
+
+
+warm_up = WarmUp(
+    [
+        ("imports", warm_imports),
+        ("openscad", warm_openscad),
+        ("card", warm_card),
+        ("preview", warm_preview),
+    ],
+    # The other steps only prime caches: the server can still build cards
+    # if they fail, and /ready reports it as degraded.
+    required=["imports", "openscad"] if openscad_required() else ["imports"],
+)
+
+
+@app.get("/ready")
+async def ready():
+    """200 once the warm-up has finished, 503 before or if a required step
+    failed; lists its stages."""
+    status = warm_up.status()
+    if status["ready"]:
+        return status
+    return JSONResponse(status_code=503, content=status)
+
+
+def cache_samples(name, stats):
+    """Prometheus families for the stats() of a MeshCache or ResultCache."""
+    labels = {"cache": name}
+    return [
+        ("card_cache_entries", "gauge", "Entries in the cache.", [(labels, stats["entries"])]),
+        ("card_cache_bytes", "gauge", "Bytes held by the cache.", [(labels, stats["bytes"])]),
+        ("card_cache_max_bytes", "gauge", "Byte budget of the cache.", [(labels, stats["max_bytes"])]),
+        ("card_cache_hits_total", "counter", "Cache hits.", [(labels, stats["hits"])]),
+        ("card_cache_misses_total", "counter", "Cache misses.", [(labels, stats["misses"])]),
+        ("card_cache_evictions_total", "counter", "Cache evictions.", [(labels, stats["evictions"])]),
+    ]
+
+
+def merge_families(families):
+    """Merges families of the same name, so each is exported once."""
+    merged = {}
+    for name, kind, help_text, samples in families:
+        if name in merged:
+            merged[name][3].extend(samples)
+        else:
+            merged[name] = (name, kind, help_text, list(samples))
+    return list(merged.values())
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics of this server process (batch and job workers
+    are separate processes and not included)."""
+    exchange = exchange_stats()
+    families = [
+        ("card_openscad_calls_total", "counter", "OpenSCAD calls.", [({}, exchange["calls"])]),
+        ("card_openscad_bytes_in_total", "counter", "Bytes sent to OpenSCAD.", [({}, exchange["bytes_in"])]),
+        ("card_openscad_bytes_out_total", "counter", "Bytes read back from OpenSCAD.", [({}, exchange["bytes_out"])]),
+        ("card_openscad_io_seconds_total", "counter", "Time spent exchanging data with OpenSCAD.", [({}, exchange["io_seconds"])]),
+        ("card_openscad_run_seconds_total", "counter", "Time spent running OpenSCAD.", [({}, exchange["run_seconds"])]),
+        ("card_generate_pending", "gauge", "Card generations running or waiting.", [({}, admission.pending)]),
+        ("card_generate_waiting_cost", "gauge", "Estimated cost of the waiting card generations.",
+         [({}, admission.stats()["waiting_cost"])]),
+        ("card_generate_clients", "gauge", "Clients with running or waiting card generations.",
+         [({}, admission.stats()["clients"])]),
+        ("card_preview_pending", "gauge", "Previews running or waiting.", [({}, previews_pending)]),
+        *cache_samples("text", text_mesh_cache.stats()),
+        *cache_samples("preview_qr", preview_qr_cache.stats()),
+    ]
+    result_cache = get_result_cache()
+    if result_cache is not None:
+        families.extend(cache_samples("result", result_cache.stats()))
+    sessions = session_store.stats()
+    families.append(("card_sessions", "gauge", "Open editor sessions.", [({}, sessions["sessions"])]))
+    families.append(("card_session_bytes", "gauge", "Bytes of meshes kept by editor sessions.", [({}, sessions["bytes"])]))
+    families.append(
+        (
+            "card_jobs",
+            "gauge",
+            "Known asynchronous jobs by state.",
+            [({"state": state}, count) for state, count in job_manager.stats().items()],
         )
-        meshes_to_subtract.append(qr_cutout_mesh)
+    )
+    return PlainTextResponse(
+        render_prometheus(merge_families(families)),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+async def estimate_card_cost(request: CardRequest):
+    """card_cost off the event loop (a cold QR encode of a long URL takes
+    a while; the matrix is memoized for the build). 413 if the URL does not
+    fit in a QR code."""
+    try:
+        return await asyncio.to_thread(
+            contextvars.copy_context().run, card_cost, request)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+def rejection_error(e: AdmissionRejected):
+    """The HTTPException answering a request admission turned away."""
+    headers = None
+    if e.status_code != 413:
+        headers = {"Retry-After": str(GENERATE_RETRY_AFTER)}
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+
+async def admit(client, cost, continuation=False):
+    """admission.acquire, answering HTTPException 413, 429 or 503 when the
+    work is turned away."""
+    try:
+        await admission.acquire(client, cost, continuation=continuation)
+    except AdmissionRejected as e:
+        raise rejection_error(e)
+
 
-        qr_mesh = carver.fill_in_qr(
-            qr_pos.x,
-            qr_pos.y,
-            url=request.content.qrUrl,
-            side=qr_side
+def submit_admitted(executor, client, fn, *args):
+    """Submits admitted work to executor and returns its future.
+
+    The admission slot is released when the work itself finishes, even if
+    the client has already gone away.
+    """
+    return release_when_done(client, executor.submit, fn, *args)
+
+
+def call_soon_from_thread(loop, fn, *args):
+    """loop.call_soon_threadsafe(fn, *args) from a worker thread; dropped
+    when the loop has closed because the server shut down mid-build."""
+    try:
+        loop.call_soon_threadsafe(fn, *args)
+    except RuntimeError:
+        # Event loop is closed: there is nothing left to update.
+        pass
+
+
+def release_when_done(client, submit, *args):
+    """Calls submit(*args), which must return a concurrent future, and
+    releases client's admission slot once that future is done."""
+    loop = asyncio.get_running_loop()
+    try:
+        future = submit(*args)
+    except BaseException:
+        admission.release(client)
+        raise
+    future.add_done_callback(
+        lambda _: call_soon_from_thread(loop, admission.release, client))
+    return future
+
+
+async def run_generate(fn, *args, client="unknown", cost=1.0):
+    """Runs blocking card work on generate_executor once admission lets it.
+
+    Waiting work starts cheapest first with fair share between clients (see
+    AdmissionController). Raises HTTPException 413, 429 or 503 when the work
+    is turned away, and 500 if it fails.
+    """
+    await admit(client, cost)
+    # The context carries the request's stage timings into the worker thread.
+    future = submit_admitted(
+        generate_executor, client, contextvars.copy_context().run, fn, *args)
+
+    try:
+        return await asyncio.wrap_future(future)
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/formats")
+async def output_formats():
+    """The formats /generate can return, with the average size and encode
+    time observed by this process so far."""
+    formats = []
+    for name, (media_type, extension, _) in OUTPUT_FORMATS.items():
+        outputs = counter_value("card_outputs_total", endpoint="generate", format=name)
+        size = counter_value("card_output_bytes_total", endpoint="generate", format=name)
+        encodes, seconds = histogram_totals("card_stage_seconds", stage=f"export_{name}")
+        formats.append(
+            {
+                "format": name,
+                "media_type": media_type,
+                "extension": extension,
+                "gzip": name in GZIP_FORMATS,
+                "average_bytes": size / outputs if outputs else None,
+                "average_encode_ms": 1000.0 * seconds / encodes if encodes else None,
+            }
         )
-        
-        # Apply all subtractions in one go
-        box_mesh = carver.apply_difference(meshes_to_subtract)
+    return {"formats": formats}
 
-        # Assemble Scene
-        scene = trimesh.Scene()
-        scene.add_geometry(box_mesh, node_name="card_body")
 
-        for i, tm in enumerate(text_meshes_for_scene):
-            scene.add_geometry(tm, node_name=f"text_{i}")
+@app.post("/generate")
+async def generate_card(
+    request: CardRequest,
+    raw_request: Request,
+    format: Optional[Literal["3mf", "glb", "stl"]] = None,
+    accept: Optional[str] = Header(default=None),
+    accept_encoding: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """Builds the card as 3MF (printing), quantized GLB (viewing) or binary
+    STL (legacy slicers), picked from Accept or the format query parameter."""
+    output_format = format or negotiate_format(accept)
+    if output_format is None:
+        raise HTTPException(
+            status_code=406,
+            detail="Acceptable formats: "
+            + ", ".join(media_type for media_type, _, _ in OUTPUT_FORMATS.values()),
+        )
+    media_type, extension, _ = OUTPUT_FORMATS[output_format]
+    cache_key = f"{card_cache_key(request)}.{extension}"
+    # Weak: a regenerated card has the same geometry but new zip timestamps.
+    etag = f'W/"{cache_key}"'
+    headers = {
+        "Content-Disposition": f"attachment; filename=card.{extension}",
+        "ETag": etag,
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": headers["Vary"]})
 
-        scene.add_geometry(qr_mesh, node_name="qr_code")
-        # scene.show()
+    result_cache = get_result_cache()
+    data = None
+    if result_cache is not None:
+        data = await asyncio.to_thread(result_cache.get, cache_key)
+    if data is None:
+        cost = await estimate_card_cost(request)
+        headers["X-Card-Cost"] = "%.2f" % cost
+    if data is None and output_format == "3mf":
+        scene = await run_generate(
+            build_card_scene, request, client=client_id(raw_request), cost=cost)
 
-        # Export to 3MF in memory
-        with tempfile.NamedTemporaryFile(suffix=".3mf", delete=False) as tmp:
-            scene.export(tmp.name)
-            tmp_path = tmp.name
+        # The 3MF is serialized while it is sent, and a client that
+        # disconnects simply stops the generator.
+        chunks = meter_stream(
+            iter_3mf(scene), "export_3mf", endpoint="generate", format="3mf")
+        if result_cache is not None:
+            chunks = cached_stream(cache_key, chunks)
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
 
-        # Read file back to stream
-        # (StreamingResponse can take a file-like object or iterator)
-        # We can just return the file content.
+    if data is None:
+        data, seconds = await run_generate(
+            build_card_file, request, output_format, cache_key,
+            client=client_id(raw_request), cost=cost)
+        headers["X-Encode-Ms"] = "%.1f" % (seconds * 1000.0)
+    record_output(len(data), endpoint="generate", format=output_format)
+    headers["X-Output-Bytes"] = str(len(data))
 
-        def iterfile():
-            with open(tmp_path, "rb") as f:
-                yield from f
-            # Cleanup
-            os.remove(tmp_path)
+    if output_format in GZIP_FORMATS and accepts_gzip(accept_encoding):
+        data = await asyncio.to_thread(gzip.compress, data, GZIP_LEVEL, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=data, media_type=media_type, headers=headers)
 
-        return StreamingResponse(
-            iterfile(),
-            media_type="model/3mf",
-            headers={"Content-Disposition": "attachment; filename=card.3mf"}
+
+def submit_preview(fn, *args):
+    """Submits fn(*args) to preview_executor, or raises HTTPException 503
+    when PREVIEW_QUEUE_SIZE previews are already waiting."""
+    global previews_pending
+    if previews_pending >= PREVIEW_WORKERS + PREVIEW_QUEUE_SIZE:
+        increment("card_preview_rejected_total")
+        raise HTTPException(
+            status_code=503,
+            detail="Previews are at capacity, retry later.",
+            headers={"Retry-After": str(GENERATE_RETRY_AFTER)},
         )
+    loop = asyncio.get_running_loop()
+    future = preview_executor.submit(contextvars.copy_context().run, fn, *args)
+    previews_pending += 1
+
+    def finished():
+        global previews_pending
+        previews_pending -= 1
 
+    # Counted until the build ends, even if the client has gone away.
+    future.add_done_callback(lambda _: call_soon_from_thread(loop, finished))
+    return future
+
+
+@app.post("/preview")
+async def preview_card(
+    request: CardRequest, if_none_match: Optional[str] = Header(default=None)
+):
+    """A lightweight GLB of the card for on-screen preview (not for printing)."""
+    etag = f'W/"{preview_cache_key(request)}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    # Answers 413 for a URL too long for a QR code, as /generate does.
+    await estimate_card_cost(request)
+    future = submit_preview(build_preview_glb, request)
+    try:
+        data = await asyncio.wrap_future(future)
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+    record_output(len(data), endpoint="preview", format="glb")
+    return Response(content=data, media_type="model/gltf-binary", headers={"ETag": etag})
+
+
+def get_job_or_404(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return job
+
+
+async def start_admitted_job(job, client, cost):
+    """Starts a held job once admission gives it a generation slot, which
+    it keeps until its worker process has exited."""
+    try:
+        await admission.acquire(client, cost, continuation=True)
+        release_when_done(client, job_manager.start, job)
+    finally:
+        pending_jobs.pop(job.id, None)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: CardRequest, raw_request: Request):
+    """Queues the card as a job. It waits for a generation slot like a
+    /generate call, but is only turned away (413, 429 or 503) up front."""
+    client = client_id(raw_request)
+    cost = await estimate_card_cost(request)
+    try:
+        admission.check(client, cost)
+    except AdmissionRejected as e:
+        raise rejection_error(e)
+    try:
+        job = job_manager.submit(
+            build_card_job, (request,), card_stages(card_text_fields(request)), hold=True)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(GENERATE_RETRY_AFTER)},
+        )
+    pending_jobs[job.id] = asyncio.create_task(start_admitted_job(job, client, cost))
+    return {
+        "id": job.id,
+        "state": job.state,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result",
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return get_job_or_404(job_id).status()
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = get_job_or_404(job_id)
+    if job.state == FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.state != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.state}.")
+    record_output(len(job.result), endpoint="jobs", format="3mf")
+    return Response(
+        content=job.result,
+        media_type="model/3mf",
+        headers={"Content-Disposition": "attachment; filename=card.3mf"},
+    )
+
+
+@app.delete("/jobs/{job_id}", status_code=204)
+async def cancel_job(job_id: str):
+    """Cancels a queued or running job (killing its OpenSCAD processes), or
+    discards a finished one."""
+    if not job_manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    waiting = pending_jobs.pop(job_id, None)
+    if waiting is not None:
+        waiting.cancel()
+    return Response(status_code=204)
+
+
+def merge_patch(target, patch):
+    """JSON merge of patch into target (nested objects are merged, not replaced)."""
+    merged = dict(target)
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_patch(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def patched_request(request: CardRequest, patch) -> CardRequest:
+    """request with patch merged in; raises HTTPException 422 if the result is invalid."""
+    try:
+        return CardRequest.model_validate(merge_patch(request.model_dump(), patch))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def session_response(session, scene, rebuilt):
+    return StreamingResponse(
+        meter_stream(iter_3mf(scene), "export_3mf", endpoint="sessions", format="3mf"),
+        media_type="model/3mf",
+        headers={
+            "Content-Disposition": "attachment; filename=card.3mf",
+            "X-Session-Id": session.id,
+            # Which intermediate meshes this render had to rebuild.
+            "X-Rebuilt-Nodes": ",".join(rebuilt),
+        },
+    )
+
+
+def get_session_or_404(session_id):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    return session
+
+
+@app.post("/sessions", status_code=201)
+async def create_session(request: CardRequest, raw_request: Request):
+    """Opens a session, after turning away (413) a card that could never be
+    built, before it holds any memory."""
+    cost = await estimate_card_cost(request)
+    try:
+        # Only the size limit: the load is checked when it renders.
+        admission.check(client_id(raw_request), cost, continuation=True)
+    except AdmissionRejected as e:
+        raise rejection_error(e)
+    try:
+        session = session_store.create(request)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(GENERATE_RETRY_AFTER)},
+        )
+    return {"id": session.id, "ttl": SESSION_TTL}
+
+
+@app.get("/sessions/{session_id}")
+async def render_session_card(session_id: str, raw_request: Request):
+    session = get_session_or_404(session_id)
+    scene, rebuilt = await run_generate(
+        render_session, session,
+        client=client_id(raw_request), cost=await estimate_card_cost(session.request))
+    return session_response(session, scene, rebuilt)
+
+
+@app.patch("/sessions/{session_id}")
+async def patch_session(session_id: str, patch: Dict, raw_request: Request):
+    """Applies a partial update of design, content and/or positions and renders."""
+    session = get_session_or_404(session_id)
+    unknown = set(patch) - {"design", "content", "positions"}
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Only design, content and positions can be patched, got {sorted(unknown)}.",
+        )
+    # Validated here to answer 422 and estimate the cost before queueing;
+    # the session only takes the edit once the card rendered, so a refused
+    # or failed render leaves it as it was.
+    request = patched_request(session.request, patch)
+    scene, rebuilt = await run_generate(
+        render_session, session, patch,
+        client=client_id(raw_request), cost=await estimate_card_cost(request))
+    return session_response(session, scene, rebuilt)
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    return Response(status_code=204)
+
+
+@app.post("/generate/batch")
+async def generate_batch(request: BatchRequest, raw_request: Request):
+    if not request.cards:
+        raise HTTPException(status_code=400, detail="The batch has no cards.")
+    if len(request.cards) > BATCH_MAX_CARDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch is limited to {BATCH_MAX_CARDS} cards.",
+        )
+
+    bed = request.bed or BedSize()
+    if request.output == "plates":
+        try:
+            # Fail before rendering anything if the card cannot fit the bed.
+            layout_plates(
+                1,
+                request.design.dimensions.width,
+                request.design.dimensions.height,
+                bed.width,
+                bed.depth,
+                bed.spacing,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Every card takes a generation slot like a /generate call, so a batch
+    # shares the workers with everyone else instead of taking them over.
+    # Only the first card can be turned away; the rest wait for their turn.
+    cards = [
+        CardRequest(design=request.design, content=card.content, positions=card.positions)
+        for card in request.cards
+    ]
+    costs = await asyncio.gather(*(estimate_card_cost(card) for card in cards))
+    client = client_id(raw_request)
+    executor = get_batch_executor()
+    futures = []
+    try:
+        for index, card in enumerate(request.cards):
+            await admit(client, costs[index], continuation=index > 0)
+            futures.append(asyncio.wrap_future(submit_admitted(
+                executor, client, render_batch_card, request.design, card, request.output)))
+        results = await asyncio.gather(*futures)
+    except BaseException as e:
+        # Drops the cards that have not started (which frees their slots),
+        # also when the client went away.
+        for future in futures:
+            future.cancel()
+        if isinstance(e, HTTPException) or not isinstance(e, Exception):
+            raise
+        if isinstance(e, BrokenProcessPool):
+            # A worker died (e.g. OOM-killed); start a fresh pool next time.
+            global _batch_executor
+            if _batch_executor is executor:
+                _batch_executor = None
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if request.output == "cards":
+        entries = (
+            (f"card_{index:03d}.3mf", data) for index, data in enumerate(results)
+        )
+    else:
+        entries = (
+            (f"plate_{index:03d}.3mf", export_3mf(scene))
+            for index, scene in enumerate(
+                build_plate_scenes(request.design, results, bed))
+        )
+
+    return StreamingResponse(
+        meter_stream(iter_zip(entries), "export_zip", endpoint="batch", format="zip"),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=cards.zip"},
+    )
+
 
 if __name__ == "__main__":
     import uvicorn